@@ -0,0 +1,55 @@
+"""Compare requests per second for Basic and Bearer token authentication.
+
+Usage: python -m benchmarks.auth [requests]
+"""
+import sys
+import time
+from base64 import b64encode
+
+from notificationsapi import create_app
+from notificationsapi.models import db
+
+USER_NAME = 'benchmark'
+USER_PASSWORD = 'Benchmark!2019'
+
+config = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'SECRET_KEY': 'benchmark',
+    'AUTH_TOKEN_EXPIRATION': 600,
+    'PAGINATION_PAGE_SIZE': 10,
+    'PAGINATION_PAGE_ARGUMENT_NAME': 'page',
+    'SERVER_NAME': 'localhost',
+}
+
+
+def run(client, headers, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get('/users/1', headers=headers)
+        assert response.status_code == 200, response.status_code
+    elapsed = time.perf_counter() - start
+    return requests / elapsed
+
+
+def main(requests=20):
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    client.post('/users', json={'name': USER_NAME, 'password': USER_PASSWORD})
+
+    credentials = b64encode(f'{USER_NAME}:{USER_PASSWORD}'.encode()).decode()
+    basic_headers = {'Authorization': f'Basic {credentials}'}
+    token = client.get('/users/token', headers=basic_headers).get_json()['token']
+    token_headers = {'Authorization': f'Bearer {token}'}
+
+    basic_rps = run(client, basic_headers, requests)
+    token_rps = run(client, token_headers, requests)
+    print(f'basic: {basic_rps:10.1f} req/s')
+    print(f'token: {token_rps:10.1f} req/s')
+    print(f'speedup: {token_rps / basic_rps:.1f}x')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
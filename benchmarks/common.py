@@ -0,0 +1,67 @@
+import os
+from base64 import b64encode
+from datetime import datetime, timedelta
+
+from notificationsapi import create_app
+from notificationsapi.bulk import load_categories, load_notifications
+from notificationsapi.models import db
+
+USER_NAME = 'benchmark'
+USER_PASSWORD = 'Benchmark!2019'
+
+
+def make_app(database_uri=None, **config):
+    database_uri = database_uri or os.getenv('BENCHMARK_DATABASE_URI', 'sqlite://')
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SECRET_KEY': 'benchmark',
+        'AUTH_TOKEN_EXPIRATION': 3600,
+        'PAGINATION_PAGE_SIZE': 20,
+        'PAGINATION_PAGE_ARGUMENT_NAME': 'page',
+        'PAGINATION_COUNT_STRATEGY': 'exact',
+        'PAGINATION_COUNT_CACHE_TTL': 30,
+        'NOTIFICATION_BATCH_MAX_SIZE': 500,
+        'NOTIFICATION_EXPORT_CHUNK_SIZE': 1000,
+        'NOTIFICATION_CHANGES_PAGE_SIZE': 500,
+        'NOTIFICATION_EXPIRY_BATCH_SIZE': 1000,
+        'NOTIFICATION_EXPIRY_ARCHIVE': False,
+        'SERVER_NAME': 'localhost',
+    }
+    settings.update(config)
+    app = create_app(settings)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+def create_user(client, name=USER_NAME):
+    client.post('/users', json={'name': name, 'password': USER_PASSWORD})
+    credentials = b64encode(f'{name}:{USER_PASSWORD}'.encode()).decode()
+    basic_headers = {'Authorization': f'Basic {credentials}'}
+    token = client.get('/users/token', headers=basic_headers).get_json()['token']
+    token_headers = {'Authorization': f'Bearer {token}'}
+    return basic_headers, token_headers
+
+
+def seed_notifications(app, notifications, categories, expired_ratio=0.01, chunk=5000):
+    # bulk loads with COPY on PostgreSQL and executemany elsewhere
+    start = datetime.utcnow() - timedelta(days=30)
+    expired_every = int(1 / expired_ratio) if expired_ratio else 0
+
+    def items():
+        for number in range(notifications):
+            expired = expired_every and number % expired_every == 0
+            yield {
+                'message': f'notification {number:09d}',
+                'ttl': 0 if expired else 365 * 24 * 3600,
+                'creation_date': start + timedelta(seconds=number),
+                'notification_category': f'category {number % categories:05d}',
+            }
+
+    with app.app_context():
+        load_categories(
+            {'name': f'category {number:05d}'} for number in range(categories)
+        )
+        load_notifications(items(), chunk)
@@ -0,0 +1,489 @@
+"""Load benchmark for every endpoint.
+
+Builds the app with create_app() from config.TestConfig, seeds the database,
+serves the app with a threaded WSGI server and drives every resource with
+concurrent clients. Reports p50/p95/p99 latency and throughput per scenario
+and saves them as JSON, so two runs can be compared.
+
+Usage:
+    python -m benchmarks.load [--notifications N] [--categories N]
+        [--clients N] [--requests N] [--only NAME ...]
+        [--output FILE] [--compare BASELINE]
+
+BENCHMARK_DATABASE_URI selects the database, the default is a temporary
+SQLite file. Scenarios that write run last, so they don't skew the reads.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from http.client import HTTPConnection
+from threading import Thread
+from urllib.parse import quote
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from config import Config, TestConfig
+from notificationsapi import create_app
+from notificationsapi.models import db
+
+from .common import USER_PASSWORD, create_user, seed_notifications
+
+# build(context, rng, number) returns (method, path, body, credentials)
+Scenario = namedtuple('Scenario', 'name build expected')
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def benchmark_config(database_uri):
+    return type(
+        'BenchmarkConfig',
+        (TestConfig,),
+        {
+            'SQLALCHEMY_DATABASE_URI': database_uri,
+            'SECRET_KEY': 'benchmark',
+            'PAGINATION_PAGE_SIZE': 20,
+            'PAGINATION_PAGE_ARGUMENT_NAME': 'page',
+            'AUTH_TOKEN_EXPIRATION': 3600,
+            'NOTIFICATION_EXPIRY_INTERVAL': 0,
+            'METRICS_TOKEN': 'benchmark',
+            # production hashing, TestConfig makes it cheap
+            'PASSWORD_HASH_ROUNDS': Config.PASSWORD_HASH_ROUNDS,
+            'PASSWORD_HASH_PROCESSES': Config.PASSWORD_HASH_PROCESSES,
+            'TESTING': False,
+        },
+    )
+
+
+def notification_id(context, rng):
+    return rng.randint(*context['notification_ids'])
+
+
+def category_id(context, rng):
+    return rng.randint(*context['category_ids'])
+
+
+def unique(context, prefix):
+    return f'{prefix} {context["run"]} {next(context["sequence"])}'
+
+
+def scenarios():
+    return [
+        Scenario(
+            'users detail',
+            lambda context, rng, number: ('GET', '/users/1', None, 'token'),
+            {200},
+        ),
+        Scenario(
+            'users detail, basic auth',
+            lambda context, rng, number: ('GET', '/users/1', None, 'basic'),
+            {200},
+        ),
+        Scenario(
+            'users list',
+            lambda context, rng, number: ('GET', '/users?cursor=', None, 'token'),
+            {200},
+        ),
+        Scenario(
+            'users token',
+            lambda context, rng, number: ('GET', '/users/token', None, 'basic'),
+            {200},
+        ),
+        Scenario(
+            'notifications list, first page',
+            lambda context, rng, number: ('GET', '/notifications', None, 'token'),
+            {200},
+        ),
+        Scenario(
+            'notifications list, deep page',
+            lambda context, rng, number: (
+                'GET',
+                '/notifications?page={}'.format(rng.randint(1, context['pages'])),
+                None,
+                'token',
+            ),
+            {200},
+        ),
+        Scenario(
+            'notifications list, cursor',
+            lambda context, rng, number: (
+                'GET',
+                '/notifications?cursor=&created_after={}'.format(
+                    quote(context['created_after'](rng))
+                ),
+                None,
+                'token',
+            ),
+            {200},
+        ),
+        Scenario(
+            'notifications list, by category',
+            lambda context, rng, number: (
+                'GET',
+                f'/notifications?cursor=&category_id={category_id(context, rng)}',
+                None,
+                'token',
+            ),
+            {200},
+        ),
+        Scenario(
+            'notifications list, sparse fields',
+            lambda context, rng, number: (
+                'GET',
+                '/notifications?cursor=&fields=id,message',
+                None,
+                'token',
+            ),
+            {200},
+        ),
+        Scenario(
+            'notifications search',
+            lambda context, rng, number: (
+                'GET',
+                '/notifications/search?q={:09d}'.format(
+                    rng.randint(0, context['notifications'] - 1)
+                ),
+                None,
+                'token',
+            ),
+            {200},
+        ),
+        Scenario(
+            'notifications detail',
+            lambda context, rng, number: (
+                'GET',
+                f'/notifications/{notification_id(context, rng)}',
+                None,
+                'token',
+            ),
+            {200, 404},
+        ),
+        Scenario(
+            'notifications export',
+            lambda context, rng, number: (
+                'GET',
+                '/notifications/export?category_id={}&created_before={}'.format(
+                    category_id(context, rng), quote(context['export_before'])
+                ),
+                None,
+                'token',
+            ),
+            {200},
+        ),
+        Scenario(
+            'categories list',
+            lambda context, rng, number: (
+                'GET',
+                '/notification_categories',
+                None,
+                'token',
+            ),
+            {200},
+        ),
+        Scenario(
+            'categories detail',
+            lambda context, rng, number: (
+                'GET',
+                f'/notification_categories/{category_id(context, rng)}',
+                None,
+                'token',
+            ),
+            {200},
+        ),
+        Scenario(
+            'metrics',
+            lambda context, rng, number: ('GET', '/metrics', None, 'metrics'),
+            {200},
+        ),
+        Scenario(
+            'notifications create',
+            lambda context, rng, number: (
+                'POST',
+                '/notifications',
+                {
+                    'message': unique(context, 'load'),
+                    'ttl': 3600,
+                    'notification_category': f'category {rng.randrange(10):05d}',
+                },
+                'token',
+            ),
+            {201},
+        ),
+        Scenario(
+            'notifications batch',
+            lambda context, rng, number: (
+                'POST',
+                '/notifications/batch',
+                [
+                    {
+                        'message': unique(context, 'batch'),
+                        'ttl': 3600,
+                        'notification_category': {'name': 'category 00000'},
+                    }
+                    for _ in range(10)
+                ],
+                'token',
+            ),
+            {201},
+        ),
+        Scenario(
+            'notifications patch',
+            lambda context, rng, number: (
+                'PATCH',
+                f'/notifications/{notification_id(context, rng)}',
+                {'displayed_times': rng.randint(1, 100), 'displayed_once': True},
+                'token',
+            ),
+            {200, 404},
+        ),
+        Scenario(
+            'notifications mark displayed',
+            lambda context, rng, number: (
+                'POST',
+                f'/notifications/{notification_id(context, rng)}/displayed',
+                None,
+                'token',
+            ),
+            {202},
+        ),
+        Scenario(
+            'categories create',
+            lambda context, rng, number: (
+                'POST',
+                '/notification_categories',
+                {'name': unique(context, 'category')},
+                'token',
+            ),
+            {201},
+        ),
+        Scenario(
+            'categories patch',
+            lambda context, rng, number: (
+                'PATCH',
+                f'/notification_categories/{category_id(context, rng)}',
+                {'name': unique(context, 'renamed')},
+                'token',
+            ),
+            {200},
+        ),
+        Scenario(
+            'users create',
+            lambda context, rng, number: (
+                'POST',
+                '/users',
+                {'name': unique(context, 'user'), 'password': USER_PASSWORD},
+                None,
+            ),
+            {201},
+        ),
+        Scenario(
+            'notifications delete',
+            lambda context, rng, number: (
+                'DELETE',
+                f'/notifications/{context["notification_ids"][1] - number}',
+                None,
+                'token',
+            ),
+            {204, 404},
+        ),
+    ]
+
+
+def send(port, method, path, body, headers):
+    connection = HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        payload = None
+        headers = dict(headers)
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def run_scenario(scenario, context, clients, requests):
+    numbers = itertools.count()
+    latencies = []
+    failures = []
+
+    def client(worker):
+        rng = random.Random(f'{scenario.name} {worker}')
+        while True:
+            number = next(numbers)
+            if number >= requests:
+                return
+            method, path, body, credentials = scenario.build(context, rng, number)
+            headers = context['headers'].get(credentials, {})
+            start = time.perf_counter()
+            status = send(context['port'], method, path, body, headers)
+            latencies.append(time.perf_counter() - start)
+            if status not in scenario.expected:
+                failures.append(status)
+
+    threads = [Thread(target=client, args=(worker,)) for worker in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return summarize(latencies, failures, elapsed)
+
+
+def percentile(ordered, percent):
+    index = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def summarize(latencies, failures, elapsed):
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'errors': len(failures),
+        'error_statuses': sorted(set(failures)),
+        'throughput': len(ordered) / elapsed,
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+    }
+
+
+def prepare(app, notifications, categories):
+    client = app.test_client()
+    basic_headers, token_headers = create_user(client)
+    seed_notifications(app, notifications, categories)
+    with app.app_context():
+        notification_ids = db.session.execute(
+            'SELECT min(id), max(id) FROM notification'
+        ).first()
+        category_ids = db.session.execute(
+            'SELECT min(id), max(id) FROM notification_category'
+        ).first()
+        first_created = db.session.execute(
+            'SELECT min(creation_date) FROM notification'
+        ).scalar()
+        dialect = db.engine.dialect.name
+    if isinstance(first_created, str):
+        first_created = datetime.fromisoformat(first_created)
+    # seeded notifications are one second apart
+    span = max(notifications - 100, 1)
+    return {
+        'run': os.getpid(),
+        'sequence': itertools.count(),
+        'dialect': dialect,
+        'notifications': notifications,
+        'notification_ids': tuple(notification_ids),
+        'category_ids': tuple(category_ids),
+        'pages': max(notifications // 20, 1),
+        'created_after': lambda rng: (
+            first_created + timedelta(seconds=rng.randrange(span))
+        ).isoformat(),
+        'export_before': (first_created + timedelta(seconds=1000)).isoformat(),
+        'headers': {
+            'basic': basic_headers,
+            'token': token_headers,
+            'metrics': {'Authorization': 'Bearer benchmark'},
+        },
+    }
+
+
+def compare(results, baseline):
+    print(f'\n{"scenario":36} {"p50":>16} {"p95":>16} {"p99":>16}')
+    for name, current in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            continue
+        columns = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            change = (current[key] / previous[key] - 1) * 100 if previous[key] else 0
+            columns.append(f'{current[key]:8.2f} {change:+6.1f}%')
+        print(f'{name:36} ' + ' '.join(f'{column:>16}' for column in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notifications', type=int, default=10000)
+    parser.add_argument('--categories', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--only', action='append', help='run only this scenario')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help='results file of an earlier run')
+    args = parser.parse_args(argv)
+
+    database_uri = os.getenv('BENCHMARK_DATABASE_URI')
+    if database_uri is None:
+        path = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+        database_uri = f'sqlite:///{path}'
+    app = create_app(benchmark_config(database_uri))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    server = make_server(
+        '127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler
+    )
+    app.config['SERVER_NAME'] = f'127.0.0.1:{server.server_port}'
+    context = prepare(app, args.notifications, args.categories)
+    context['port'] = server.server_port
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    results = {
+        'meta': {
+            'notifications': args.notifications,
+            'categories': args.categories,
+            'clients': args.clients,
+            'requests': args.requests,
+            'database': context['dialect'],
+            'python': platform.python_version(),
+            'started_at': datetime.utcnow().isoformat(),
+        },
+        'scenarios': {},
+    }
+    print(
+        f'{"scenario":36} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} '
+        f'{"p99 ms":>9} {"errors":>7}'
+    )
+    try:
+        for scenario in scenarios():
+            if args.only and scenario.name not in args.only:
+                continue
+            summary = run_scenario(scenario, context, args.clients, args.requests)
+            results['scenarios'][scenario.name] = summary
+            print(
+                f'{scenario.name:36} {summary["throughput"]:9.1f} '
+                f'{summary["p50_ms"]:9.2f} {summary["p95_ms"]:9.2f} '
+                f'{summary["p99_ms"]:9.2f} {summary["errors"]:7}'
+            )
+    finally:
+        server.shutdown()
+
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    print(f'\nResults saved to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+    failed = sum(summary['errors'] for summary in results['scenarios'].values())
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
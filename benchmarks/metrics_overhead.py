@@ -0,0 +1,44 @@
+"""Measure the request overhead of the /metrics instrumentation.
+
+Replays the same listing request with METRICS_ENABLED off and on and reports
+the requests per second of both.
+
+Usage: python -m benchmarks.metrics_overhead [--requests N]
+"""
+import argparse
+import sys
+import time
+
+from .common import make_app, create_user, seed_notifications
+
+
+def requests_per_second(metrics_enabled, requests):
+    app = make_app(METRICS_ENABLED=metrics_enabled)
+    client = app.test_client()
+    _, token_headers = create_user(client)
+    seed_notifications(app, 1000, 10, expired_ratio=0)
+    url = '/notifications?cursor='
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(url, headers=token_headers)
+        assert response.status_code == 200, response.status_code
+    return requests / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    # warm up imports and caches so the first run isn't penalized
+    requests_per_second(False, 50)
+    without_metrics = requests_per_second(False, args.requests)
+    with_metrics = requests_per_second(True, args.requests)
+    print(f'metrics off: {without_metrics:10.1f} req/s')
+    print(f'metrics on:  {with_metrics:10.1f} req/s')
+    print(f'overhead: {(1 - with_metrics / without_metrics) * 100:.1f}%')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
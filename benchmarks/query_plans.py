@@ -0,0 +1,227 @@
+"""Query plan regression check.
+
+Seeds a large dataset, replays a request against every endpoint, captures
+the SQL each one runs and EXPLAINs it. Exits with status 1 if any statement
+reads a large table with a sequential scan, or if a request runs a different
+number of statements than expected.
+
+Usage: python -m benchmarks.query_plans [--notifications N] [--categories N]
+
+Point BENCHMARK_DATABASE_URI at a PostgreSQL database to check the plans
+production will get; the default is an in-memory SQLite database.
+"""
+import argparse
+import re
+import sys
+
+from notificationsapi.expiry import purge_expired_batch
+from notificationsapi.models import db
+from notificationsapi.utils.query_counter import assert_num_queries
+
+from .common import make_app, create_user, seed_notifications
+
+LARGE_TABLES = {'notification', 'notification_change', 'user'}
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def explain(connection, dialect, statement, parameters):
+    cursor = connection.cursor()
+    if dialect == 'postgresql':
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+        plan = cursor.fetchone()[0][0]['Plan']
+        lines, scans = [], []
+        walk_postgresql_plan(plan, 0, lines, scans)
+        return lines, scans
+
+    cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+    lines = [row[-1] for row in cursor.fetchall()]
+    scans = []
+    for line in lines:
+        match = SQLITE_FULL_SCAN.match(line)
+        if match:
+            scans.append(match.group(1))
+    return lines, scans
+
+
+def walk_postgresql_plan(node, depth, lines, scans):
+    relation = node.get('Relation Name')
+    index = node.get('Index Name')
+    description = node['Node Type']
+    if relation:
+        description += f' on {relation}'
+    if index:
+        description += f' using {index}'
+    lines.append('  ' * depth + description)
+    if node['Node Type'] == 'Seq Scan':
+        scans.append(relation)
+    for child in node.get('Plans', []):
+        walk_postgresql_plan(child, depth + 1, lines, scans)
+
+
+def checked(statement):
+    # counts are allowed to scan, the count strategies exist for that
+    return statement.lstrip().upper().startswith('SELECT') and 'count(' not in statement
+
+
+def capture_requests(app, client, basic_headers, token_headers):
+    with app.app_context():
+        category_id = db.session.execute('SELECT max(id) FROM notification_category')
+        category_id = category_id.scalar()
+        notification_id = db.session.execute('SELECT max(id) FROM notification')
+        notification_id = notification_id.scalar()
+        sequence = db.session.execute('SELECT max(sequence) FROM notification_change')
+        sequence = sequence.scalar()
+
+    first_page = client.get('/notifications?cursor=', headers=token_headers)
+    deep_cursor = first_page.get_json()['next']
+    category_page = client.get(
+        f'/notification_categories/{category_id}?limit=20', headers=token_headers
+    )
+
+    requests = [
+        ('basic auth user lookup', '/users/1', basic_headers, 1),
+        ('users, first cursor page', '/users?cursor=', token_headers, 1),
+        (
+            'notifications, first cursor page',
+            '/notifications?cursor=',
+            token_headers,
+            3,
+        ),
+        ('notifications, next cursor page', deep_cursor, token_headers, 3),
+        (
+            'notifications by category name',
+            '/notifications?cursor=&category=category%2000001',
+            token_headers,
+            3,
+        ),
+        (
+            'notifications by category id',
+            f'/notifications?cursor=&category_id={category_id}',
+            token_headers,
+            3,
+        ),
+        (
+            'notifications by displayed_once',
+            '/notifications?cursor=&displayed_once=true',
+            token_headers,
+            3,
+        ),
+        (
+            'notifications sorted by displayed_times',
+            '/notifications?cursor=&sort=-displayed_times',
+            token_headers,
+            3,
+        ),
+        (
+            'notifications by displayed_times range',
+            '/notifications?cursor=&sort=displayed_times&displayed_times_min=5',
+            token_headers,
+            3,
+        ),
+        (
+            'notification search',
+            '/notifications/search?q=notification%20000000042',
+            token_headers,
+            1,
+        ),
+        (
+            'notification changes',
+            f'/notifications/changes?since={sequence - 100}',
+            token_headers,
+            3,
+        ),
+        ('notification detail', f'/notifications/{notification_id}', token_headers, 1),
+        # the category row was cached by category_page above
+        (
+            'category detail',
+            f'/notification_categories/{category_id}?limit=20',
+            token_headers,
+            3,
+        ),
+        (
+            'category detail, next notifications page',
+            category_page.get_json()['next'],
+            token_headers,
+            3,
+        ),
+    ]
+
+    captured = []
+    mismatches = []
+    for name, url, headers, statements in requests:
+        try:
+            with assert_num_queries(db.get_engine(app), statements) as counter:
+                response = client.get(url, headers=headers)
+        except AssertionError as error:
+            mismatches.append((name, error))
+        assert response.status_code == 200, (name, response.status_code)
+        captured.append((name, counter))
+
+    with app.app_context():
+        # the change log takes an advisory lock on PostgreSQL
+        statements = 5 if db.engine.dialect.name == 'postgresql' else 4
+        try:
+            with assert_num_queries(db.engine, statements) as counter:
+                purge_expired_batch(100)
+        except AssertionError as error:
+            mismatches.append(('expiry purge batch', error))
+    captured.append(('expiry purge batch', counter))
+    return captured, mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notifications', type=int, default=100_000)
+    parser.add_argument('--categories', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    app = make_app()
+    client = app.test_client()
+    basic_headers, token_headers = create_user(client)
+    seed_notifications(app, args.notifications, args.categories)
+
+    failures = []
+    with app.app_context():
+        engine = db.engine
+        dialect = engine.dialect.name
+        if dialect == 'postgresql':
+            db.session.execute('ANALYZE')
+            db.session.commit()
+        captured, mismatches = capture_requests(
+            app, client, basic_headers, token_headers
+        )
+
+        connection = engine.raw_connection()
+        try:
+            for name, counter in captured:
+                print(f'== {name}')
+                executions = zip(counter.statements, counter.parameters)
+                for statement, parameters in executions:
+                    if not checked(statement):
+                        continue
+                    lines, scans = explain(connection, dialect, statement, parameters)
+                    print('   ' + ' '.join(statement.split())[:120])
+                    for line in lines:
+                        print('     ' + line)
+                    for table in scans:
+                        if table in LARGE_TABLES:
+                            failures.append((name, table))
+        finally:
+            connection.close()
+
+    if mismatches:
+        print('\nUnexpected numbers of statements:')
+        for name, error in mismatches:
+            print(f'  {name}: {error}')
+    if failures:
+        print('\nSequential scans on large tables:')
+        for name, table in failures:
+            print(f'  {name}: {table}')
+    if failures or mismatches:
+        return 1
+    print('\nNo sequential scans on large tables, statement counts as expected.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
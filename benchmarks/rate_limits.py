@@ -0,0 +1,183 @@
+"""Rate limiting and load shedding check.
+
+Builds the app with small token buckets on a frozen clock, cheap password
+hashes and a concurrency cap of one. Checks that clients over their rate get
+a 429 with Retry-After without any SQL being run, and that other clients are
+unaffected. Checks that verified Basic credentials are limited per user from
+any address, and that unverified ones spend a small login bucket of their
+address, so wrong passwords can't drain the bucket of the user they name.
+Checks that signups are limited per address, and that requests past the cap
+are shed with a 503 without spending tokens.
+Exits with status 1 if any check fails.
+
+Usage: python -m benchmarks.rate_limits
+"""
+import argparse
+import sys
+import time
+from base64 import b64encode
+
+from notificationsapi.models import db
+from notificationsapi.utils.query_counter import QueryCounter
+
+from .common import USER_PASSWORD, make_app, create_user
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--burst', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    burst = args.burst
+    app = make_app(
+        RATELIMIT_ENABLED=True,
+        RATELIMIT_RATES={
+            'read': (2, burst),
+            'write': (2, burst),
+            'token': (2, burst),
+            'signup': (0.1, burst),
+            'login': (2, burst),
+        },
+        RATELIMIT_MAX_CONCURRENCY=1,
+        # hashed in the request and fast, time only moves when the clock does
+        PASSWORD_HASH_ROUNDS=1000,
+        PASSWORD_HASH_PROCESSES=0,
+    )
+    limiter = app.extensions['rate_limiter']
+    clock = FrozenClock()
+    limiter.store.clock = clock
+    client = app.test_client()
+    basic_headers, token_headers = create_user(client)
+    other = app.test_client()
+    other.environ_base['REMOTE_ADDR'] = '10.0.0.2'
+    _, other_headers = create_user(other, 'other')
+
+    failures = []
+
+    def check(name, condition):
+        print(f'{"ok  " if condition else "FAIL"} {name}')
+        if not condition:
+            failures.append(name)
+
+    statuses = [
+        client.get('/notifications', headers=token_headers).status_code
+        for _ in range(burst)
+    ]
+    check(f'a burst of {burst} reads is allowed', set(statuses) == {200})
+    with QueryCounter(db.get_engine(app)) as counter:
+        response = client.get('/notifications', headers=token_headers)
+    check('the next read gets a 429', response.status_code == 429)
+    check('with a Retry-After header', response.headers.get('Retry-After') == '1')
+    check('without running any SQL', counter.count == 0)
+    elsewhere = app.test_client()
+    elsewhere.environ_base['REMOTE_ADDR'] = '10.0.0.3'
+    response = elsewhere.get('/notifications', headers=basic_headers)
+    check(
+        'Basic credentials of the same user get a 429 from another address',
+        response.status_code == 429 and response.headers.get('Retry-After') == '1',
+    )
+    check(
+        'other users keep their own bucket',
+        other.get('/notifications', headers=other_headers).status_code == 200,
+    )
+    # two users behind one address, as behind a proxy or NAT
+    shared = app.test_client()
+    shared.environ_base['REMOTE_ADDR'] = '10.0.0.4'
+    first_headers, _ = create_user(shared, 'first behind nat')
+    second_headers, _ = create_user(shared, 'second behind nat')
+    statuses = [
+        shared.get('/notifications', headers=headers).status_code
+        for headers in (first_headers, second_headers)
+    ]
+    check('Basic users behind one address are served', set(statuses) == {200})
+    check(
+        'their reads spend no read tokens of the address',
+        limiter.store.buckets.get('read:address:10.0.0.4') is None,
+    )
+    attacker = app.test_client()
+    attacker.environ_base['REMOTE_ADDR'] = '10.0.0.5'
+    wrong_headers = {
+        'Authorization': 'Basic '
+        + b64encode(f'first behind nat:wrong {USER_PASSWORD}'.encode()).decode()
+    }
+    statuses = [
+        attacker.get('/notifications', headers=wrong_headers).status_code
+        for _ in range(burst)
+    ]
+    check('wrong passwords get a 401', set(statuses) == {401})
+    with QueryCounter(db.get_engine(app)) as counter:
+        response = attacker.get('/notifications', headers=wrong_headers)
+    check(
+        'past the burst they get a 429 before the user is looked up',
+        response.status_code == 429 and counter.count == 0,
+    )
+    check(
+        'the user they name is still served',
+        shared.get('/notifications', headers=first_headers).status_code == 200,
+    )
+    response = client.post(
+        '/notifications',
+        json={'message': 'rate limited', 'ttl': 60, 'notification_category': 'limits'},
+        headers=token_headers,
+    )
+    check('writes have a bucket of their own', response.status_code == 201)
+    clock.advance(1)
+    check(
+        'the bucket refills over time',
+        client.get('/notifications', headers=token_headers).status_code == 200,
+    )
+
+    # create_user() already spent a signup of each address
+    statuses = [
+        signup(client, f'signup {number}').status_code for number in range(burst)
+    ]
+    check('signups are limited per address', statuses[-1] == 429)
+    check(
+        'signups from another address are not',
+        signup(other, 'another signup').status_code == 201,
+    )
+
+    # hold the only slot, as a request in progress would
+    clock.advance(burst / 2)
+    limiter.slots.acquire()
+    try:
+        statuses = [
+            other.get('/notifications', headers=other_headers).status_code
+            for _ in range(burst)
+        ]
+    finally:
+        limiter.slots.release()
+    check('requests past the concurrency cap get a 503', set(statuses) == {503})
+    statuses = [
+        other.get('/notifications', headers=other_headers).status_code
+        for _ in range(burst)
+    ]
+    check('shed requests spend no tokens', set(statuses) == {200})
+    clock.advance(1)
+    check(
+        'the slot is released after every request',
+        other.get('/notifications', headers=other_headers).status_code == 200,
+    )
+
+    if failures:
+        return 1
+    return 0
+
+
+class FrozenClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def signup(client, name):
+    return client.post('/users', json={'name': name, 'password': USER_PASSWORD})
+
+
+if __name__ == '__main__':
+    sys.exit(main())
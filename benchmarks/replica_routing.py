@@ -0,0 +1,133 @@
+"""Read-replica routing check.
+
+Runs the API against two SQLite files, a primary and a replica that only
+catches up when this script copies the primary over it, so replication lag
+is under control. Checks that GET requests read the replica, that writes go
+to the primary, that a client reads its own writes during the sticky window
+and that caches aren't refilled from the replica. Exits with status 1 if any
+check fails.
+
+Usage: python -m benchmarks.replica_routing [--sticky-seconds N]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from base64 import b64encode
+
+from notificationsapi.models import category_cache, db
+from notificationsapi.utils.query_counter import QueryCounter
+
+from .common import make_app, create_user
+
+
+def replicate(primary_path, replica_path):
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def messages(client, headers):
+    response = client.get('/notifications?cursor=', headers=headers)
+    return [item['message'] for item in response.get_json()['results']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sticky-seconds', type=int, default=2)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    primary_path = os.path.join(directory, 'primary.db')
+    replica_path = os.path.join(directory, 'replica.db')
+    app = make_app(
+        f'sqlite:///{primary_path}',
+        SQLALCHEMY_REPLICA_URI=f'sqlite:///{replica_path}',
+        REPLICA_STICKY_SECONDS=args.sticky_seconds,
+    )
+    client = app.test_client()
+    _, writer_headers = create_user(client)
+    # the reader comes from another address, sign ups are sticky by address
+    reader = app.test_client()
+    reader.environ_base['REMOTE_ADDR'] = '10.0.0.2'
+    reader.post('/users', json={'name': 'reader', 'password': 'Reader!2019'})
+    credentials = b64encode(b'reader:Reader!2019').decode()
+    reader_token = reader.get(
+        '/users/token', headers={'Authorization': f'Basic {credentials}'}
+    ).get_json()['token']
+    reader_headers = {'Authorization': f'Bearer {reader_token}'}
+    client.post(
+        '/notifications',
+        json={'message': 'settled', 'ttl': 3600, 'notification_category': 'steady'},
+        headers=writer_headers,
+    )
+    category_id = client.get(
+        '/notification_categories', headers=writer_headers
+    ).get_json()['categories'][0]['id']
+    replicate(primary_path, replica_path)
+    time.sleep(args.sticky_seconds + 0.5)
+
+    with app.app_context():
+        primary = db.get_engine(app)
+        replica = db.get_engine(app, bind='replica')
+
+    failures = []
+
+    def check(name, condition):
+        print(f'{"ok  " if condition else "FAIL"} {name}')
+        if not condition:
+            failures.append(name)
+
+    with QueryCounter(primary) as on_primary, QueryCounter(replica) as on_replica:
+        response = client.post(
+            '/notifications',
+            json={'message': 'written', 'ttl': 3600, 'notification_category': 'lag'},
+            headers=writer_headers,
+        )
+    check('write accepted', response.status_code == 201)
+    check('write went to the primary', on_primary.count and not on_replica.count)
+
+    with QueryCounter(primary) as on_primary, QueryCounter(replica) as on_replica:
+        reader_messages = messages(reader, reader_headers)
+    check('other clients read the replica', on_replica.count and not on_primary.count)
+    check('the replica lags behind', 'written' not in reader_messages)
+    check(
+        'the writer reads its own write', 'written' in messages(client, writer_headers)
+    )
+
+    time.sleep(args.sticky_seconds + 0.5)
+    check(
+        'the writer reads the replica after the sticky window',
+        'written' not in messages(client, writer_headers),
+    )
+
+    client.patch(
+        f'/notification_categories/{category_id}',
+        json={'name': 'renamed'},
+        headers=writer_headers,
+    )
+    reader.get(
+        f'/notification_categories/{category_id}?notifications=false',
+        headers=reader_headers,
+    )
+    check(
+        'caches are not refilled from the replica',
+        category_cache.get(('id', category_id)) is None,
+    )
+
+    replicate(primary_path, replica_path)
+    check('the replica caught up', 'written' in messages(reader, reader_headers))
+
+    if failures:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
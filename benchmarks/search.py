@@ -0,0 +1,54 @@
+"""Full-text search benchmark.
+
+Seeds growing tables and times /notifications/search for a term that matches
+a handful of rows, next to a LIKE '%term%' scan over the same table. The
+search should stay roughly flat while the scan grows with the table.
+
+Usage: python -m benchmarks.search [--sizes N,N,...] [--repeat N]
+"""
+import argparse
+import sys
+import time
+
+from notificationsapi.models.notification import Notification
+
+from .common import make_app, create_user, seed_notifications
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,40000,160000')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    print(f'{"rows":>8}  {"search ms":>10}  {"like scan ms":>12}')
+    for size in [int(size) for size in args.sizes.split(',')]:
+        app = make_app()
+        client = app.test_client()
+        _, token_headers = create_user(client)
+        seed_notifications(app, size, 50, expired_ratio=0)
+
+        # seeded messages are 'notification <number>', one of them matches
+        term = f'{size // 2:09d}'
+        url = f'/notifications/search?q={term}'
+        response = client.get(url, headers=token_headers)
+        assert response.status_code == 200, response.status_code
+        assert response.get_json()['count'] == 1, response.get_json()
+
+        search_time = timed(lambda: client.get(url, headers=token_headers), args.repeat)
+        with app.app_context():
+            like = Notification.query.filter(Notification.message.like(f'%{term}%'))
+            scan_time = timed(like.all, args.repeat)
+        print(f'{size:>8}  {search_time:>10.2f}  {scan_time:>12.2f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
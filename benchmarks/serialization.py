@@ -0,0 +1,96 @@
+"""Serialization microbenchmark.
+
+Dumps pages of notifications, categories and users with the marshmallow
+schemas and with their compiled fast serializers, checks that both produce
+byte-identical JSON and reports the speedup.
+
+Usage: python -m benchmarks.serialization [--rows N] [--repeat N]
+"""
+import argparse
+import json
+import sys
+import timeit
+
+from notificationsapi.models import db
+from notificationsapi.models.category import (
+    NotificationCategory,
+    NotificationCategorySchema,
+)
+from notificationsapi.models.notification import Notification, NotificationSchema
+from notificationsapi.models.user import User, UserSchema
+from notificationsapi.utils.serialization import FastSerializer
+
+from .common import make_app, create_user, seed_notifications
+
+
+def cases(rows):
+    notifications = (
+        Notification.query.options(db.joinedload(Notification.notification_category))
+        .order_by(Notification.id)
+        .limit(rows)
+        .all()
+    )
+    return [
+        ('notifications', NotificationSchema(many=True), notifications),
+        (
+            'notifications without category',
+            NotificationSchema(many=True, exclude=['notification_category']),
+            notifications,
+        ),
+        (
+            'categories',
+            NotificationCategorySchema(many=True),
+            NotificationCategory.query.order_by(NotificationCategory.id).all(),
+        ),
+        ('users', UserSchema(many=True), User.query.order_by(User.id).all()),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    app = make_app()
+    client = app.test_client()
+    create_user(client)
+    seed_notifications(app, args.rows, max(args.rows // 10, 1), expired_ratio=0)
+
+    mismatches = []
+    with app.test_request_context():
+        for name, schema, objects in cases(args.rows):
+            serializer = FastSerializer(schema)
+            # the fast serializers don't check themselves at runtime, this is
+            # where a difference from the schema shows up
+            expected = json.dumps(schema.dump(objects))
+            fast = json.dumps(serializer.dump(objects))
+            single = [
+                json.dumps(serializer.dump(obj, many=False))
+                == json.dumps(schema.dump(obj, many=False))
+                for obj in objects[:10]
+            ]
+            if fast != expected or not all(single):
+                mismatches.append(name)
+                continue
+            schema_time = timeit.timeit(
+                lambda: schema.dump(objects), number=args.repeat
+            )
+            fast_time = timeit.timeit(
+                lambda: serializer.dump(objects), number=args.repeat
+            )
+            print(
+                f'{name:32} {len(objects):6} rows  '
+                f'schema {schema_time / args.repeat * 1000:8.2f} ms  '
+                f'fast {fast_time / args.repeat * 1000:8.2f} ms  '
+                f'{schema_time / fast_time:5.1f}x'
+            )
+
+    if mismatches:
+        print('\nOutput differs from the schema for: ' + ', '.join(mismatches))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Idle subscriber check for /notifications/stream.
+
+Serves the app with a threaded WSGI server, opens thousands of event streams
+from this same process and leaves them idle, then creates notifications and
+waits until every matching stream received them. Reports the memory and
+threads the idle streams cost and the fan-out latency, and checks that slow
+consumers are cut off without blocking the publisher. Exits with status 1 if
+any check fails.
+
+Usage: python -m benchmarks.stream_subscribers [--subscribers N]
+"""
+import argparse
+import json
+import os
+import selectors
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.client import HTTPConnection
+
+from werkzeug.serving import make_server
+
+from notificationsapi import create_app
+from notificationsapi.broker import OVERFLOW, Broker
+from notificationsapi.models import db
+
+from .common import create_user
+from .load import QuietRequestHandler, benchmark_config
+
+
+def rss_kib():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def open_stream(port, headers, category=None):
+    path = '/notifications/stream'
+    if category is not None:
+        path += f'?category={category}'
+    stream = socket.create_connection(('127.0.0.1', port))
+    request = f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+    for name, value in headers.items():
+        request += f'{name}: {value}\r\n'
+    stream.sendall((request + '\r\n').encode())
+    stream.setblocking(False)
+    return stream
+
+
+def read_until(streams, marker, timeout):
+    """Read from streams until every one of them received marker, returns the
+    ones that didn't.
+    """
+    selector = selectors.DefaultSelector()
+    buffers = {}
+    for stream in streams:
+        selector.register(stream, selectors.EVENT_READ)
+        buffers[stream] = b''
+    waiting = set(streams)
+    deadline = time.perf_counter() + timeout
+    while waiting and time.perf_counter() < deadline:
+        for key, _ in selector.select(timeout=0.1):
+            stream = key.fileobj
+            data = stream.recv(65536)
+            buffers[stream] += data
+            if marker in buffers[stream] or not data:
+                selector.unregister(stream)
+                waiting.discard(stream)
+    selector.close()
+    return waiting
+
+
+def create_notification(port, headers, message, category):
+    connection = HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        connection.request(
+            'POST',
+            '/notifications',
+            json.dumps(
+                {'message': message, 'ttl': 3600, 'notification_category': category}
+            ),
+            dict(headers, **{'Content-Type': 'application/json'}),
+        )
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+def slow_consumer(queue_size):
+    # nobody reads this subscription, the publisher must not notice
+    broker = Broker(queue_size=queue_size)
+    subscription = broker.subscribe()
+    event = {'event': 'created', 'category': 1, 'category_name': 'slow'}
+    start = time.perf_counter()
+    for _ in range(queue_size * 10):
+        broker.dispatch(dict(event, notification={}))
+    elapsed = time.perf_counter() - start
+    return subscription.get(timeout=0) is OVERFLOW and not broker.subscriptions, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    database_uri = os.getenv('BENCHMARK_DATABASE_URI')
+    if database_uri is None:
+        path = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+        database_uri = f'sqlite:///{path}'
+    config = benchmark_config(database_uri)
+    config.EVENTS_HEARTBEAT_INTERVAL = 1
+    app = create_app(config)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    _, token_headers = create_user(app.test_client())
+    broker = app.extensions['notification_events']
+
+    server = make_server(
+        '127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler
+    )
+    server.socket.listen(1024)
+    app.config['SERVER_NAME'] = f'127.0.0.1:{server.server_port}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    failures = []
+
+    def check(name, condition):
+        print(f'{"ok  " if condition else "FAIL"} {name}')
+        if not condition:
+            failures.append(name)
+
+    rss_before, threads_before = rss_kib(), threading.active_count()
+    # every other stream only wants the alerts category
+    streams = [
+        open_stream(port, token_headers, 'alerts' if number % 2 else None)
+        for number in range(args.subscribers)
+    ]
+    unopened = read_until(streams, b'retry:', timeout=60)
+    check(f'{args.subscribers} streams opened', not unopened)
+    # let the heartbeats of the idle streams go by
+    time.sleep(2)
+    rss_after, threads_after = rss_kib(), threading.active_count()
+    print(
+        f'idle streams: {len(broker.subscriptions)}, '
+        f'{(rss_after - rss_before) / args.subscribers:.1f} KiB and '
+        f'{(threads_after - threads_before) / args.subscribers:.2f} threads each'
+    )
+
+    unfiltered, alerts = streams[::2], streams[1::2]
+    start = time.perf_counter()
+    status = create_notification(port, token_headers, 'stream to everyone', 'alerts')
+    missed = read_until(streams, b'event: created', timeout=30)
+    elapsed = time.perf_counter() - start
+    check('notification created', status == 201)
+    check('every subscriber received it', not missed)
+    print(f'fan-out to {len(streams)} streams: {elapsed * 1000:.1f} ms')
+
+    create_notification(port, token_headers, 'stream to unfiltered', 'other')
+    check(
+        'unfiltered subscribers received the other category',
+        not read_until(unfiltered, b'stream to unfiltered', timeout=30),
+    )
+    check(
+        'alerts subscribers skipped the other category',
+        read_until(alerts, b'stream to unfiltered', timeout=2) == set(alerts),
+    )
+
+    cut_off, elapsed = slow_consumer(queue_size=100)
+    check('a slow consumer is cut off', cut_off)
+    print(f'publishing 1000 events past a stuck consumer: {elapsed * 1000:.1f} ms')
+
+    for stream in streams:
+        stream.close()
+    deadline = time.perf_counter() + 10
+    while broker.subscriptions and time.perf_counter() < deadline:
+        time.sleep(0.1)
+    check('closed streams unsubscribed', not broker.subscriptions)
+
+    server.shutdown()
+    if failures:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
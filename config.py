@@ -12,9 +12,98 @@ class Config:
     DB_URI = 'postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}'
     SQLALCHEMY_DATABASE_URI = DB_URI
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # GET requests read from this database when set, everything else uses the
+    # primary. Clients that wrote stick to the primary for REPLICA_STICKY_SECONDS.
+    SQLALCHEMY_REPLICA_URI = os.getenv('SQLALCHEMY_REPLICA_URI')
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
     PAGINATION_PAGE_SIZE = os.getenv('PAGINATION_PAGE_SIZE')
     PAGINATION_PAGE_ARGUMENT_NAME = os.getenv('PAGINATION_PAGE_ARGUMENT_NAME')
+    PAGINATION_CURSOR_ARGUMENT_NAME = os.getenv(
+        'PAGINATION_CURSOR_ARGUMENT_NAME', 'cursor'
+    )
+    # exact, cached or estimated; PAGINATION_COUNT_STRATEGIES overrides it per
+    # resource, keyed by endpoint name (e.g. 'notification.notificationlistresource')
+    PAGINATION_COUNT_STRATEGY = os.getenv('PAGINATION_COUNT_STRATEGY', 'exact')
+    PAGINATION_COUNT_STRATEGIES = {}
+    PAGINATION_COUNT_CACHE_TTL = int(os.getenv('PAGINATION_COUNT_CACHE_TTL', 30))
+    PAGINATION_COUNT_CACHE_SIZE = int(os.getenv('PAGINATION_COUNT_CACHE_SIZE', 1024))
+    NOTIFICATION_BATCH_MAX_SIZE = int(os.getenv('NOTIFICATION_BATCH_MAX_SIZE', 500))
+    NOTIFICATION_EXPORT_CHUNK_SIZE = int(
+        os.getenv('NOTIFICATION_EXPORT_CHUNK_SIZE', 1000)
+    )
+    NOTIFICATION_CHANGES_PAGE_SIZE = int(
+        os.getenv('NOTIFICATION_CHANGES_PAGE_SIZE', 500)
+    )
+    # seconds the change log keeps a change, pruned by the expiry reaper and
+    # flask prune-changes; older cursors get a 410 and have to resync
+    NOTIFICATION_CHANGES_RETENTION = int(
+        os.getenv('NOTIFICATION_CHANGES_RETENTION', 7 * 24 * 3600)
+    )
+    # POST /notifications/<id>/displayed buffers increments and writes them every
+    # interval, or once this many are pending; an interval of 0 writes through
+    NOTIFICATION_DISPLAY_FLUSH_INTERVAL = int(
+        os.getenv('NOTIFICATION_DISPLAY_FLUSH_INTERVAL', 1)
+    )
+    NOTIFICATION_DISPLAY_MAX_PENDING = int(
+        os.getenv('NOTIFICATION_DISPLAY_MAX_PENDING', 10000)
+    )
+    # seconds between background purges of expired notifications, 0 disables it
+    NOTIFICATION_EXPIRY_INTERVAL = int(os.getenv('NOTIFICATION_EXPIRY_INTERVAL', 0))
+    NOTIFICATION_EXPIRY_BATCH_SIZE = int(
+        os.getenv('NOTIFICATION_EXPIRY_BATCH_SIZE', 1000)
+    )
+    NOTIFICATION_EXPIRY_ARCHIVE = os.getenv('NOTIFICATION_EXPIRY_ARCHIVE') == '1'
+    CATEGORY_CACHE_SIZE = int(os.getenv('CATEGORY_CACHE_SIZE', 1024))
+    # The category cache is per process and only invalidated by the writing
+    # one, the other workers may use a renamed or deleted category this long
+    CATEGORY_CACHE_TTL = int(os.getenv('CATEGORY_CACHE_TTL', 30))
+    # compiled serializers for listings and exports, same output as the schemas
+    FAST_SERIALIZATION = os.getenv('FAST_SERIALIZATION', '1') == '1'
+    # request latency, SQL and auth metrics in Prometheus format on /metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+    # /metrics is only served with a token, scrapers send it as a Bearer token
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    # /notifications/stream: 'local' delivers the events of this process only,
+    # 'postgresql' goes through LISTEN/NOTIFY so every worker sees every event
+    EVENTS_BACKEND = os.getenv('EVENTS_BACKEND', 'local')
+    # events buffered per subscriber before a slow one is disconnected
+    EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 100))
+    EVENTS_HEARTBEAT_INTERVAL = int(os.getenv('EVENTS_HEARTBEAT_INTERVAL', 15))
+    # The first scheme hashes new passwords. Hashes with another scheme or round
+    # count are rehashed on the next successful login.
+    PASSWORD_HASH_SCHEMES = os.getenv(
+        'PASSWORD_HASH_SCHEMES', 'sha512_crypt,sha256_crypt'
+    ).split(',')
+    PASSWORD_HASH_ROUNDS = int(os.getenv('PASSWORD_HASH_ROUNDS', 656000))
+    # worker processes hashing and verifying passwords, 0 hashes in the request
+    PASSWORD_HASH_PROCESSES = int(os.getenv('PASSWORD_HASH_PROCESSES', 2))
+    # hashes pending at once across all the hashing processes, and seconds to
+    # wait for a slot before a 503
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 64))
+    PASSWORD_HASH_TIMEOUT = int(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+    # Token buckets per client and endpoint class, as (requests per second,
+    # burst). Signups, token requests and Basic credentials hash a password and
+    # have buckets of their own. Signups are limited per client address. Basic
+    # credentials spend a login token of the address before they're checked,
+    # and a token of the user's bucket after. A redis:// URI shares the buckets
+    # between workers, it needs the redis package.
+    RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', '1') == '1'
+    RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', 'memory://')
+    RATELIMIT_RATES = {
+        'read': (50, 100),
+        'write': (10, 20),
+        'token': (1, 10),
+        'signup': (0.1, 5),
+        'login': (1, 10),
+    }
+    # requests a worker process handles at once before shedding load with a
+    # 503, 0 disables the cap
+    RATELIMIT_MAX_CONCURRENCY = int(os.getenv('RATELIMIT_MAX_CONCURRENCY', 64))
     WTF_CSRF_ENABLED = True
+    # Seconds a bearer token is valid. Tokens are checked by their signature
+    # alone, so one stays valid for this long after its user is deleted or the
+    # password changes. Changing SECRET_KEY revokes every token at once.
+    AUTH_TOKEN_EXPIRATION = int(os.getenv('AUTH_TOKEN_EXPIRATION', 600))
 
 
 class DevConfig(Config):
@@ -30,4 +119,8 @@ class TestConfig(Config):
     TESTING = True
     WTF_CSRF_ENABLED = False
     SERVER_NAME = '127.0.0.1'
+    # cheap hashes computed in the request, tests don't need the pool
+    PASSWORD_HASH_ROUNDS = 1000
+    PASSWORD_HASH_PROCESSES = 0
+    RATELIMIT_ENABLED = False
     DB_NAME = os.getenv('TEST_DB_NAME')
@@ -0,0 +1,54 @@
+"""false() server default of notification.displayed_once
+
+Revision ID: 7b2d94e1c0f6
+Revises: 3f6b0c92e7a1
+Create Date: 2026-10-18 23:52:41.630527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2d94e1c0f6'
+down_revision = '3f6b0c92e7a1'
+branch_labels = None
+depends_on = None
+
+# SQLite rebuilds the table to change a default, which drops its triggers
+search_triggers = (
+    'CREATE TRIGGER notification_search_insert AFTER INSERT ON notification '
+    'BEGIN INSERT INTO notification_search(rowid, message) '
+    'VALUES (new.id, new.message); END',
+    'CREATE TRIGGER notification_search_delete AFTER DELETE ON notification '
+    'BEGIN INSERT INTO notification_search(notification_search, rowid, message) '
+    "VALUES ('delete', old.id, old.message); END",
+    'CREATE TRIGGER notification_search_update '
+    'AFTER UPDATE OF message ON notification '
+    'BEGIN INSERT INTO notification_search(notification_search, rowid, message) '
+    "VALUES ('delete', old.id, old.message); "
+    'INSERT INTO notification_search(rowid, message) '
+    'VALUES (new.id, new.message); END',
+)
+
+
+def alter_displayed_once(server_default):
+    with op.batch_alter_table('notification') as batch_op:
+        batch_op.alter_column(
+            'displayed_once',
+            existing_type=sa.Boolean(),
+            existing_nullable=False,
+            server_default=server_default,
+        )
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in search_triggers:
+            op.execute(trigger)
+
+
+def upgrade():
+    # 'false' fails the CHECK constraint of the column on SQLite
+    alter_displayed_once(sa.false())
+
+
+def downgrade():
+    alter_displayed_once('false')
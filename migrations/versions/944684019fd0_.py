@@ -0,0 +1,58 @@
+"""notification expiry
+
+Revision ID: 944684019fd0
+Revises: e3dd2d651e3d
+Create Date: 2026-10-18 18:50:12.408813
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '944684019fd0'
+down_revision = 'e3dd2d651e3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('notification', sa.Column('expires_at', sa.TIMESTAMP(), nullable=True))
+
+    # backfill from creation_date + ttl (in UTC, like the application computes it)
+    # before making the column mandatory
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute(
+            "UPDATE notification SET expires_at = datetime("
+            "coalesce(creation_date, CURRENT_TIMESTAMP), '+' || ttl || ' seconds')"
+        )
+    else:
+        op.execute(
+            "UPDATE notification SET expires_at = "
+            "(coalesce(creation_date, LOCALTIMESTAMP) "
+            "AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC') "
+            "+ ttl * interval '1 second'"
+        )
+
+    with op.batch_alter_table('notification') as batch_op:
+        batch_op.alter_column('expires_at', existing_type=sa.TIMESTAMP(), nullable=False)
+    op.create_index(op.f('ix_notification_expires_at'), 'notification', ['expires_at'], unique=False)
+
+    op.create_table('notification_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('message', sa.String(length=250), nullable=False),
+    sa.Column('ttl', sa.Integer(), nullable=False),
+    sa.Column('creation_date', sa.TIMESTAMP(), nullable=True),
+    sa.Column('notification_category_id', sa.Integer(), nullable=False),
+    sa.Column('displayed_times', sa.Integer(), nullable=False),
+    sa.Column('displayed_once', sa.Boolean(), nullable=False),
+    sa.Column('expires_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('archived_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('notification_archive')
+    op.drop_index(op.f('ix_notification_expires_at'), table_name='notification')
+    op.drop_column('notification', 'expires_at')
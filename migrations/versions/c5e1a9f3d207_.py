@@ -0,0 +1,43 @@
+"""log notification changes in UTC
+
+Revision ID: c5e1a9f3d207
+Revises: 7b2d94e1c0f6
+Create Date: 2026-10-18 21:34:18.207415
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e1a9f3d207'
+down_revision = '7b2d94e1c0f6'
+branch_labels = None
+depends_on = None
+
+
+# SQLite's CURRENT_TIMESTAMP is in UTC already, PostgreSQL's is converted to
+# the session time zone when stored in a column without one
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(
+        'UPDATE notification_change SET changed_at = '
+        "changed_at AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC'"
+    )
+    op.execute(
+        'ALTER TABLE notification_change ALTER COLUMN changed_at '
+        "SET DEFAULT TIMEZONE('utc', CURRENT_TIMESTAMP)"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(
+        'ALTER TABLE notification_change ALTER COLUMN changed_at '
+        'SET DEFAULT CURRENT_TIMESTAMP'
+    )
+    op.execute(
+        'UPDATE notification_change SET changed_at = '
+        "changed_at AT TIME ZONE 'UTC' AT TIME ZONE current_setting('TimeZone')"
+    )
@@ -0,0 +1,74 @@
+"""full-text search over notification messages
+
+Revision ID: d82b4e6f0a13
+Revises: 5c1f8a27d9b4
+Create Date: 2026-10-18 20:14:09.318842
+
+On PostgreSQL the search vector is a generated column, which needs
+PostgreSQL 12 or later. Adding a STORED column rewrites the whole notification
+table under an ACCESS EXCLUSIVE lock, and the GIN index is built without
+CONCURRENTLY, so reads and writes of notification wait for both. On a large
+table run it in a maintenance window.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd82b4e6f0a13'
+down_revision = '5c1f8a27d9b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # a generated column stays in sync with message without any trigger
+        op.execute(
+            "ALTER TABLE notification ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('english', message)) STORED"
+        )
+        op.execute(
+            'CREATE INDEX ix_notification_search_vector ON notification '
+            'USING gin (search_vector)'
+        )
+    elif dialect == 'sqlite':
+        op.execute(
+            'CREATE VIRTUAL TABLE notification_search USING fts5('
+            "message, content='notification', content_rowid='id', "
+            "tokenize='porter unicode61')"
+        )
+        op.execute(
+            'CREATE TRIGGER notification_search_insert AFTER INSERT ON notification '
+            'BEGIN INSERT INTO notification_search(rowid, message) '
+            'VALUES (new.id, new.message); END'
+        )
+        op.execute(
+            'CREATE TRIGGER notification_search_delete AFTER DELETE ON notification '
+            'BEGIN INSERT INTO notification_search(notification_search, rowid, message) '
+            "VALUES ('delete', old.id, old.message); END"
+        )
+        op.execute(
+            'CREATE TRIGGER notification_search_update '
+            'AFTER UPDATE OF message ON notification '
+            'BEGIN INSERT INTO notification_search(notification_search, rowid, message) '
+            "VALUES ('delete', old.id, old.message); "
+            'INSERT INTO notification_search(rowid, message) '
+            'VALUES (new.id, new.message); END'
+        )
+        op.execute(
+            "INSERT INTO notification_search(notification_search) VALUES ('rebuild')"
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_notification_search_vector', table_name='notification')
+        op.drop_column('notification', 'search_vector')
+    elif dialect == 'sqlite':
+        op.execute('DROP TRIGGER notification_search_update')
+        op.execute('DROP TRIGGER notification_search_delete')
+        op.execute('DROP TRIGGER notification_search_insert')
+        op.execute('DROP TABLE notification_search')
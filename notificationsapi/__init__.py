@@ -1,4 +1,6 @@
 import os
+from collections.abc import Mapping
+
 from flask import Flask
 from flask_migrate import Migrate
 
@@ -6,6 +8,8 @@ from flask_migrate import Migrate
 def create_app(config=None):
     from .models import init_app
     from .routes import register_blueprint
+    from .commands import register_commands
+    from . import broker, display, expiry, metrics, passwords, ratelimit
 
     # instantiate flask app
     app = Flask(__name__)
@@ -13,13 +17,35 @@ def create_app(config=None):
     # configure app
     if config is None:
         app.config.from_object(os.getenv('APP_SETTINGS'))
-    else:
+    elif isinstance(config, Mapping):
         app.config.from_mapping(config)
+    else:
+        # a config class such as config.TestConfig, or its import path
+        app.config.from_object(config)
 
     # initialize database and blueprints
     db = init_app(app)
     register_blueprint(app)
+    register_commands(app)
 
     Migrate(app, db)
 
+    # password hashing and verification in a process pool
+    passwords.init_app(app)
+
+    # per endpoint latency and SQL metrics, served on /metrics
+    metrics.init_app(app)
+
+    # per client rate limits and a concurrency cap, checked before any query
+    ratelimit.init_app(app)
+
+    # committed notification changes, pushed on /notifications/stream
+    broker.init_app(app)
+
+    # write-behind counter behind POST /notifications/<id>/displayed
+    display.init_app(app)
+
+    # optional background purge of expired notifications
+    expiry.init_app(app)
+
     return app
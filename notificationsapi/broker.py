@@ -0,0 +1,217 @@
+import json
+import os
+import select
+import time
+from itertools import count
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+
+from sqlalchemy import event, text
+
+from .models.base import RoutingSession, db
+
+# returned by Subscription.get() once the subscriber fell too far behind
+OVERFLOW = object()
+
+
+def record_event(kind, notification):
+    """Queue an event for the current transaction, it's published on commit
+    and dropped on rollback.
+    """
+    category = notification.get('notification_category') or {}
+    db.session.info.setdefault('pending_events', []).append(
+        {
+            'event': kind,
+            'category': category.get('id'),
+            'category_name': category.get('name'),
+            'notification': notification,
+        }
+    )
+
+
+class Subscription:
+    def __init__(self, category=None, queue_size=100):
+        self.category = category
+        self.queue = Queue(queue_size)
+        self.overflowed = False
+
+    def matches(self, event):
+        return self.category is None or self.category in (
+            str(event['category']),
+            event['category_name'],
+        )
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        # a subscriber that fell behind is told so instead of getting a
+        # stream with holes in it, it has to reconnect and catch up
+        if self.overflowed:
+            return OVERFLOW
+        try:
+            return self.queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+
+class Broker:
+    """Fan out committed notification events to the streams of this process.
+
+    Publishing never blocks: every subscriber has a bounded queue and the
+    ones that don't keep up are cut off.
+    """
+
+    def __init__(self, backend=None, queue_size=100):
+        self.backend = backend or LocalBackend()
+        self.queue_size = queue_size
+        self.subscriptions = set()
+        self.sequence = count(1)
+        self._lock = Lock()
+
+    def subscribe(self, category=None):
+        self.backend.start(self)
+        subscription = Subscription(category, self.queue_size)
+        with self._lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscriptions.discard(subscription)
+
+    def dispatch(self, event):
+        event = dict(event, id=next(self.sequence))
+        with self._lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                subscription.put(event)
+                if subscription.overflowed:
+                    self.unsubscribe(subscription)
+
+
+class LocalBackend:
+    """Deliver events to the subscribers of the process that committed them."""
+
+    def start(self, broker):
+        pass
+
+    def before_commit(self, session, events):
+        pass
+
+    def after_commit(self, broker, events):
+        for item in events:
+            broker.dispatch(item)
+
+
+class PostgresBackend(LocalBackend):
+    """Deliver events to every worker with PostgreSQL LISTEN/NOTIFY.
+
+    The NOTIFY runs inside the writing transaction, so PostgreSQL sends it on
+    commit only. Each worker process LISTENs on its own connection.
+    """
+
+    channel = 'notification_events'
+    notify = text(
+        'SELECT pg_notify(:channel, payload) '
+        'FROM unnest(CAST(:payloads AS text[])) AS payload'
+    )
+
+    def __init__(self, app, reconnect_delay=1):
+        self.app = app
+        self.reconnect_delay = reconnect_delay
+        self._pid = None
+        self._lock = Lock()
+
+    def start(self, broker):
+        # started on the first subscriber, after the server forked its workers
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            Thread(
+                target=self.listen,
+                args=(broker,),
+                name='notification-events-listener',
+                daemon=True,
+            ).start()
+
+    def before_commit(self, session, events):
+        # One statement for the whole transaction. Every payload is still a
+        # notification of its own, so the 8000 byte limit applies per event.
+        session.execute(
+            self.notify,
+            {
+                'channel': self.channel,
+                'payloads': [json.dumps(item) for item in events],
+            },
+        )
+
+    def after_commit(self, broker, events):
+        # the listener delivers them, to this process as well
+        pass
+
+    def listen(self, broker):
+        while True:
+            try:
+                with self.app.app_context():
+                    connection = db.get_engine(self.app).raw_connection()
+                try:
+                    self.receive(connection.connection, broker)
+                finally:
+                    connection.close()
+            except Exception:
+                self.app.logger.exception('Notification events listener failed')
+                time.sleep(self.reconnect_delay)
+
+    def receive(self, connection, broker):
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.channel}')
+        while True:
+            if select.select([connection], [], [], 30) == ([], [], []):
+                continue
+            connection.poll()
+            while connection.notifies:
+                broker.dispatch(json.loads(connection.notifies.pop(0).payload))
+
+
+def session_broker(session):
+    app = getattr(session, 'app', None)
+    return app.extensions.get('notification_events') if app is not None else None
+
+
+def before_commit(session):
+    events = session.info.get('pending_events')
+    broker = session_broker(session)
+    if events and broker is not None:
+        broker.backend.before_commit(session, events)
+
+
+def after_commit(session):
+    events = session.info.pop('pending_events', None)
+    broker = session_broker(session)
+    if events and broker is not None:
+        broker.backend.after_commit(broker, events)
+
+
+def after_rollback(session):
+    session.info.pop('pending_events', None)
+
+
+def init_app(app):
+    if app.config.get('EVENTS_BACKEND', 'local') == 'postgresql':
+        backend = PostgresBackend(app)
+    else:
+        backend = LocalBackend()
+    broker = Broker(backend, queue_size=app.config.get('EVENTS_QUEUE_SIZE', 100))
+    if not event.contains(RoutingSession, 'after_commit', after_commit):
+        event.listen(RoutingSession, 'before_commit', before_commit)
+        event.listen(RoutingSession, 'after_commit', after_commit)
+        event.listen(RoutingSession, 'after_rollback', after_rollback)
+    app.extensions['notification_events'] = broker
+    return broker
@@ -0,0 +1,215 @@
+import csv
+import io
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from dateutil.parser import isoparse
+from flask import current_app
+from sqlalchemy import select
+
+from .models.base import db, dialect_name, record_inserted, record_write, utcnow
+from .models.category import NotificationCategory
+from .models.notification import Notification
+from .models.user import User
+from .passwords import configure_worker, hash_in_worker
+
+
+def batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_rows(model, rows):
+    """Insert rows (dicts with the same keys) into model's table.
+
+    PostgreSQL gets a single COPY through psycopg2, other databases one
+    executemany INSERT. Like add_many() it leaves the commit to the caller.
+    """
+    table = model.__table__
+    if dialect_name() != 'postgresql':
+        model.add_many(rows)
+        return
+
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(
+            ['' if row[column] is None else row[column] for column in columns]
+        )
+    buffer.seek(0)
+    preparer = db.engine.dialect.identifier_preparer
+    statement = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        preparer.format_table(table),
+        ', '.join(preparer.quote(column) for column in columns),
+    )
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    finally:
+        cursor.close()
+    record_write(table)
+    record_inserted(model, rows)
+
+
+def category_ids(names):
+    """Return {name: id} for names, inserting the categories that don't exist."""
+    ids = dict(
+        db.session.query(NotificationCategory.name, NotificationCategory.id).filter(
+            NotificationCategory.name.in_(names)
+        )
+    )
+    missing = [name for name in names if name not in ids]
+    if missing:
+        insert_rows(NotificationCategory, [{'name': name} for name in missing])
+        ids.update(
+            db.session.query(NotificationCategory.name, NotificationCategory.id).filter(
+                NotificationCategory.name.in_(missing)
+            )
+        )
+    return ids
+
+
+def parse_datetime(value):
+    # stored timestamps are naive UTC
+    value = isoparse(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def notification_row(item, now):
+    # accepts the items of /notifications/export, in NDJSON or CSV form
+    category = item['notification_category']
+    if isinstance(category, dict):
+        category = category['name']
+    ttl = int(item['ttl'])
+    creation_date = item.get('creation_date') or now
+    if isinstance(creation_date, str):
+        creation_date = parse_datetime(creation_date)
+    displayed_once = item.get('displayed_once') or False
+    if isinstance(displayed_once, str):
+        displayed_once = displayed_once.lower() in ('1', 'true', 'yes')
+    # Inserts through the models compute expires_at in SQL, see
+    # Notification.insert_values(). COPY and executemany don't, so it's here.
+    return {
+        'message': item['message'],
+        'ttl': ttl,
+        'creation_date': creation_date,
+        'expires_at': creation_date + timedelta(seconds=ttl),
+        'notification_category': category,
+        'displayed_times': int(item.get('displayed_times') or 0),
+        'displayed_once': displayed_once,
+    }
+
+
+def load_notifications(items, batch_size=10000, report=None):
+    """Bulk load notifications, creating their categories as needed.
+
+    Every batch is committed on its own. Returns the number of rows loaded.
+    """
+    total = 0
+    # items without a creation_date are created now, on the database clock
+    now = db.session.execute(select([utcnow()])).scalar()
+    for batch in batches(items, batch_size):
+        rows = [notification_row(item, now) for item in batch]
+        ids = category_ids(list({row['notification_category'] for row in rows}))
+        for row in rows:
+            row['notification_category_id'] = ids[row.pop('notification_category')]
+        insert_rows(Notification, rows)
+        Notification.commit()
+        total += len(rows)
+        if report is not None:
+            report('notification', total)
+    return total
+
+
+def load_categories(items, batch_size=10000, report=None):
+    total = 0
+    for batch in batches(items, batch_size):
+        insert_rows(NotificationCategory, [{'name': item['name']} for item in batch])
+        NotificationCategory.commit()
+        total += len(batch)
+        if report is not None:
+            report('notification_category', total)
+    return total
+
+
+def load_users(items, batch_size=1000, processes=None, report=None):
+    """Bulk load users from items with a name and a plain text password.
+
+    Hashing is what makes user creation slow, so the hashes of each batch
+    are computed in a pool of worker processes.
+    """
+    total = 0
+    processes = processes or os.cpu_count() or 1
+    settings = current_app.extensions['password_hasher'].settings
+    with ProcessPoolExecutor(
+        processes, initializer=configure_worker, initargs=settings
+    ) as executor:
+        for batch in batches(items, batch_size):
+            hashes = executor.map(
+                hash_in_worker,
+                [item['password'] for item in batch],
+                chunksize=max(len(batch) // (processes * 4), 1),
+            )
+            rows = [
+                {'name': item['name'], 'password_hash': password_hash}
+                for item, password_hash in zip(batch, hashes)
+            ]
+            insert_rows(User, rows)
+            User.commit()
+            total += len(rows)
+            if report is not None:
+                report('user', total)
+    return total
+
+
+def read_items(stream, file_format):
+    """Yield dicts from a CSV (with a header row) or NDJSON stream."""
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def synthetic_notifications(count, categories, prefix='seed', seed=0, expired_ratio=0):
+    """Yield notifications created less than their ttl ago, so they're live,
+    except for about expired_ratio of them that are past it already.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    for number in range(count):
+        ttl = rng.choice((3600, 24 * 3600, 7 * 24 * 3600, 365 * 24 * 3600))
+        # seconds before now, up to a month
+        age = rng.randrange(min(ttl, 30 * 24 * 3600))
+        if rng.random() < expired_ratio:
+            age += ttl
+        yield {
+            'message': f'{prefix} notification {number:09d}',
+            'ttl': ttl,
+            'creation_date': now - timedelta(seconds=age),
+            'notification_category': f'{prefix} category {number % categories:05d}',
+            'displayed_times': rng.randint(0, 20),
+            'displayed_once': rng.random() < 0.5,
+        }
+
+
+def synthetic_categories(count, prefix='seed'):
+    for number in range(count):
+        yield {'name': f'{prefix} category {number:05d}'}
+
+
+def synthetic_users(count, password, prefix='seed'):
+    for number in range(count):
+        yield {'name': f'{prefix} user {number:06d}', 'password': password}
@@ -0,0 +1,140 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from . import bulk
+from .expiry import prune_changes, purge_expired
+
+
+@click.command('purge-expired')
+@click.option('--batch-size', type=int, help='Rows deleted per transaction.')
+@click.option(
+    '--archive/--no-archive',
+    default=None,
+    help='Move expired rows to notification_archive instead of dropping them.',
+)
+@click.option('--max-batches', type=int, help='Stop after this many batches.')
+@with_appcontext
+def purge_expired_command(batch_size, archive, max_batches):
+    """Delete or archive notifications whose ttl has run out."""
+    if batch_size is None:
+        batch_size = current_app.config['NOTIFICATION_EXPIRY_BATCH_SIZE']
+    if archive is None:
+        archive = current_app.config['NOTIFICATION_EXPIRY_ARCHIVE']
+
+    def report(rows, seconds):
+        click.echo(f'Purged {rows} rows in {seconds:.3f}s')
+
+    total = purge_expired(
+        batch_size, archive=archive, max_batches=max_batches, report=report
+    )
+    click.echo(f'Purged {total} expired notifications.')
+
+
+@click.command('prune-changes')
+@click.option('--retention', type=int, help='Seconds a logged change is kept.')
+@click.option('--batch-size', type=int, help='Rows deleted per transaction.')
+@with_appcontext
+def prune_changes_command(retention, batch_size):
+    """Delete the change log entries older than the retention."""
+    if retention is None:
+        retention = current_app.config['NOTIFICATION_CHANGES_RETENTION']
+    if batch_size is None:
+        batch_size = current_app.config['NOTIFICATION_EXPIRY_BATCH_SIZE']
+
+    def report(rows, seconds):
+        click.echo(f'Pruned {rows} rows in {seconds:.3f}s')
+
+    total = prune_changes(retention, batch_size, report=report)
+    click.echo(f'Pruned {total} logged changes.')
+
+
+def report_progress(table, total):
+    click.echo(f'{table}: {total} rows')
+
+
+@click.command('seed')
+@click.option('--notifications', default=10000, show_default=True)
+@click.option('--categories', default=50, show_default=True)
+@click.option('--users', default=10, show_default=True)
+@click.option(
+    '--password', default='Seed!Passw0rd', help='Password of every seeded user.'
+)
+@click.option(
+    '--prefix',
+    default='seed',
+    show_default=True,
+    help='Prefix of the generated names, use a new one to seed again.',
+)
+@click.option(
+    '--expired-ratio',
+    default=0.0,
+    show_default=True,
+    help='Fraction of the notifications that are expired already.',
+)
+@click.option('--batch-size', default=10000, show_default=True)
+@click.option('--processes', type=int, help='Password hashing processes.')
+@with_appcontext
+def seed_command(
+    notifications,
+    categories,
+    users,
+    password,
+    prefix,
+    expired_ratio,
+    batch_size,
+    processes,
+):
+    """Bulk load synthetic categories, notifications and users."""
+    bulk.load_categories(
+        bulk.synthetic_categories(categories, prefix), batch_size, report_progress
+    )
+    bulk.load_notifications(
+        bulk.synthetic_notifications(
+            notifications, categories, prefix, expired_ratio=expired_ratio
+        ),
+        batch_size,
+        report_progress,
+    )
+    bulk.load_users(
+        bulk.synthetic_users(users, password, prefix),
+        processes=processes,
+        report=report_progress,
+    )
+
+
+@click.command('load')
+@click.argument('kind', type=click.Choice(['notifications', 'categories', 'users']))
+@click.argument('source', type=click.File('r'))
+@click.option(
+    '--format',
+    'file_format',
+    type=click.Choice(['csv', 'ndjson']),
+    help='Defaults to the file extension.',
+)
+@click.option('--batch-size', default=10000, show_default=True)
+@click.option('--processes', type=int, help='Password hashing processes.')
+@with_appcontext
+def load_command(kind, source, file_format, batch_size, processes):
+    """Bulk load rows from a CSV or NDJSON file, - for stdin.
+
+    Notifications take the format of /notifications/export, categories need a
+    name and users a name and a password.
+    """
+    if file_format is None:
+        file_format = 'csv' if source.name.endswith('.csv') else 'ndjson'
+    items = bulk.read_items(source, file_format)
+    if kind == 'notifications':
+        total = bulk.load_notifications(items, batch_size, report_progress)
+    elif kind == 'categories':
+        total = bulk.load_categories(items, batch_size, report_progress)
+    else:
+        total = bulk.load_users(items, processes=processes, report=report_progress)
+    click.echo(f'Loaded {total} {kind}.')
+
+
+def register_commands(app):
+    app.cli.add_command(purge_expired_command)
+    app.cli.add_command(prune_changes_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(load_command)
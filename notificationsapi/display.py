@@ -0,0 +1,172 @@
+import atexit
+import os
+from threading import Event, Lock, Thread
+
+from sqlalchemy import bindparam, select, true
+
+from .broker import record_event
+from .models.base import db, record_change, record_write
+from .models.category import NotificationCategory
+from .models.notification import Notification, NotificationSchema
+
+
+class DisplayCounter:
+    """Write-behind buffer of notification display counts.
+
+    Displays are added up in memory and flushed as one batched UPDATE of
+    displayed_times = displayed_times + n per notification, so concurrent
+    displays never overwrite each other and a display costs no query.
+    """
+
+    def __init__(self, app, max_pending=10000, flush_interval=1):
+        self.app = app
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._total = 0
+        self._lock = Lock()
+        self.flusher = None
+        self._flusher_lock = Lock()
+        self._flusher_pid = None
+
+    def increment(self, id, times=1):
+        self.start_flusher()
+        with self._lock:
+            self._pending[id] = self._pending.get(id, 0) + times
+            self._total += times
+            full = self._total >= self.max_pending
+        # the buffer is bounded: past max_pending the caller pays for the flush
+        if full:
+            try:
+                self.flush()
+            except Exception:
+                # the increments were kept for the next flush, the display
+                # itself was still counted
+                self.app.logger.exception('Display count flush failed')
+
+    def start_flusher(self):
+        # Started by the first display of the serving process, so CLI commands
+        # don't run one and a preloading server starts it after the fork
+        if not self.flush_interval or self._flusher_pid == os.getpid():
+            return
+        with self._flusher_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self.flusher = DisplayFlusher(self, self.flush_interval)
+            self.flusher.start()
+            atexit.register(self.flusher.stop)
+            self._flusher_pid = os.getpid()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending, self._total = self._pending, {}, 0
+        if not pending:
+            return 0
+        notification = Notification.__table__
+        statement = (
+            notification.update()
+            .where(notification.c.id == bindparam('notification_id'))
+            .values(
+                displayed_times=notification.c.displayed_times + bindparam('times'),
+                displayed_once=true(),
+                version=notification.c.version + 1,
+            )
+        )
+        # rows in id order, so concurrent flushes from other workers can't deadlock
+        ids = sorted(pending)
+        try:
+            db.session.execute(
+                statement, [{'notification_id': id, 'times': pending[id]} for id in ids]
+            )
+            record_write(notification)
+            # unknown ids updated nothing and get neither a change nor an event
+            rows = updated_rows(ids)
+            record_change(Notification, 'updated', [row.id for row in rows])
+            for row in rows:
+                record_event('updated', event_data(row))
+            Notification.commit()
+        except Exception:
+            db.session.rollback()
+            self.restore(pending)
+            raise
+        return len(ids)
+
+    def restore(self, pending):
+        # a failed flush keeps its increments for the next one
+        with self._lock:
+            for id, times in pending.items():
+                self._pending[id] = self._pending.get(id, 0) + times
+                self._total += times
+
+
+# ids per SELECT of the flushed rows, below SQLite's bound variable limit
+SELECT_CHUNK_SIZE = 500
+
+# flushes also run outside of requests, where URLs can't be built
+event_schema = NotificationSchema(exclude=('url', 'notification_category'))
+
+
+def updated_rows(ids):
+    notification = Notification.__table__
+    category = NotificationCategory.__table__
+    query = select(
+        [
+            notification,
+            category.c.id.label('category_id'),
+            category.c.name.label('category_name'),
+        ]
+    ).select_from(notification.join(category))
+    rows = []
+    for start in range(0, len(ids), SELECT_CHUNK_SIZE):
+        end = start + SELECT_CHUNK_SIZE
+        rows += db.session.execute(query.where(notification.c.id.in_(ids[start:end])))
+    return rows
+
+
+def event_data(row):
+    data = event_schema.dump(row)
+    data['notification_category'] = {'id': row.category_id, 'name': row.category_name}
+    return data
+
+
+class DisplayFlusher(Thread):
+    """Background thread that flushes the display counter every interval."""
+
+    def __init__(self, counter, interval):
+        super().__init__(name='notification-display-flusher', daemon=True)
+        self.counter = counter
+        self.interval = interval
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        app = self.counter.app
+        with app.app_context():
+            try:
+                self.counter.flush()
+            except Exception:
+                app.logger.exception('Display count flush failed')
+            finally:
+                db.session.remove()
+
+    def stop(self):
+        # pending increments are written on shutdown
+        self.stopped.set()
+        self.flush()
+
+
+def init_app(app):
+    interval = app.config.get('NOTIFICATION_DISPLAY_FLUSH_INTERVAL', 1)
+    counter = DisplayCounter(
+        app,
+        max_pending=app.config.get('NOTIFICATION_DISPLAY_MAX_PENDING', 10000),
+        flush_interval=interval,
+    )
+    if not interval:
+        # no background flush, every display is written through
+        counter.max_pending = 1
+    app.extensions['display_counter'] = counter
+    return counter
@@ -0,0 +1,197 @@
+import os
+import time
+from datetime import timedelta
+from itertools import takewhile
+from threading import Event, Lock, Thread
+
+from sqlalchemy import select
+
+from .models.base import db, record_change, record_write, utcnow
+from .models.notification import (
+    Notification,
+    NotificationArchive,
+    NotificationChange,
+    NotificationChangeWatermark,
+)
+
+
+def purge_expired_batch(batch_size, archive=False):
+    """Delete (or archive) up to batch_size expired notifications.
+
+    Every batch is its own short transaction, so the reaper never holds locks
+    on more than batch_size rows at a time.
+    """
+    notification = Notification.__table__
+    # SKIP LOCKED lets concurrent reapers work on different rows on PostgreSQL,
+    # other dialects ignore the locking clause
+    expired_ids = (
+        select([notification.c.id])
+        .where(notification.c.expires_at <= utcnow())
+        .order_by(notification.c.expires_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    ids = [row.id for row in db.session.execute(expired_ids)]
+    if not ids:
+        db.session.rollback()
+        return 0
+
+    if archive:
+        archive_table = NotificationArchive.__table__
+        columns = [
+            column.name
+            for column in archive_table.columns
+            if column.name in notification.columns
+        ]
+        db.session.execute(
+            archive_table.insert().from_select(
+                columns,
+                select([notification.c[name] for name in columns]).where(
+                    notification.c.id.in_(ids)
+                ),
+            )
+        )
+    db.session.execute(notification.delete().where(notification.c.id.in_(ids)))
+    record_write(notification)
+    record_change(Notification, 'deleted', ids)
+    Notification.commit()
+    return len(ids)
+
+
+def purge_expired(batch_size, archive=False, max_batches=None, report=None):
+    """Purge expired notifications in batches until none are left.
+
+    report is called with (rows, seconds) after every batch. Returns the total
+    number of purged rows.
+    """
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        started = time.perf_counter()
+        purged = purge_expired_batch(batch_size, archive=archive)
+        if not purged:
+            break
+        total += purged
+        batches += 1
+        if report is not None:
+            report(purged, time.perf_counter() - started)
+    return total
+
+
+def prune_changes_batch(retention, batch_size):
+    """Delete up to batch_size changes logged more than retention seconds ago.
+
+    The watermark moves to the last pruned change in the same transaction, so
+    /notifications/changes answers 410 to the cursors before it. The newest
+    change is always kept, SQLite would hand its sequence out again.
+    """
+    change = NotificationChange.__table__
+    # on the database clock, which wrote changed_at
+    now = db.session.execute(select([utcnow()])).scalar()
+    horizon = now - timedelta(seconds=retention)
+    oldest = db.session.execute(
+        select([change.c.sequence, change.c.changed_at])
+        .order_by(change.c.sequence)
+        .limit(batch_size + 1)
+    ).fetchall()
+    # changes are logged in commit order, the ones past retention come first
+    pruned = list(takewhile(lambda row: row.changed_at < horizon, oldest[:-1]))
+    if not pruned:
+        db.session.rollback()
+        return 0
+    last = pruned[-1].sequence
+    db.session.execute(change.delete().where(change.c.sequence <= last))
+    watermark = NotificationChangeWatermark.__table__
+    db.session.execute(
+        watermark.update().where(watermark.c.sequence < last).values(sequence=last)
+    )
+    db.session.commit()
+    return len(pruned)
+
+
+def prune_changes(retention, batch_size, report=None):
+    """Prune the change log in batches, returns the number of deleted changes."""
+    total = 0
+    while True:
+        started = time.perf_counter()
+        pruned = prune_changes_batch(retention, batch_size)
+        if not pruned:
+            return total
+        total += pruned
+        if report is not None:
+            report(pruned, time.perf_counter() - started)
+
+
+class ExpiryReaper:
+    """Purges expired notifications every interval in a background thread,
+    and the changes the change log no longer keeps.
+    """
+
+    def __init__(self, app, interval, batch_size, archive=False, retention=None):
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.archive = archive
+        self.retention = retention
+        self.thread = None
+        self.stopped = Event()
+        self._lock = Lock()
+        self._pid = None
+
+    def start(self):
+        # Started by the first request of the serving process, so CLI commands
+        # don't run one and a preloading server starts it after the fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.stopped = Event()
+            self.thread = Thread(
+                target=self.run, name='notification-expiry-reaper', daemon=True
+            )
+            self.thread.start()
+            self._pid = os.getpid()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    total = purge_expired(
+                        self.batch_size, archive=self.archive, report=self.report
+                    )
+                    if total:
+                        self.app.logger.info('Purged %d expired notifications', total)
+                    if self.retention is not None:
+                        total = prune_changes(self.retention, self.batch_size)
+                        if total:
+                            self.app.logger.info('Pruned %d logged changes', total)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Expired notification purge failed')
+                finally:
+                    db.session.remove()
+
+    def report(self, rows, seconds):
+        self.app.logger.debug(
+            'Purged a batch of %d expired notifications in %.3fs', rows, seconds
+        )
+
+    def stop(self):
+        self.stopped.set()
+
+
+def init_app(app):
+    interval = app.config.get('NOTIFICATION_EXPIRY_INTERVAL', 0)
+    if not interval:
+        return None
+    reaper = ExpiryReaper(
+        app,
+        interval=interval,
+        batch_size=app.config['NOTIFICATION_EXPIRY_BATCH_SIZE'],
+        archive=app.config['NOTIFICATION_EXPIRY_ARCHIVE'],
+        retention=app.config.get('NOTIFICATION_CHANGES_RETENTION'),
+    )
+    app.before_request(reaper.start)
+    app.extensions['expiry_reaper'] = reaper
+    return reaper
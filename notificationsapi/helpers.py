@@ -1,42 +1,181 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
 from flask import url_for
 from flask import current_app
+from flask_restful import abort
+from sqlalchemy import tuple_
+
+from .utils.http_status import HttpStatus
+from .utils.counting import exact_count, get_count_strategy
+from .utils.serialization import serializer_for
 
 
 class PaginationHelper:
-    def __init__(self, request, query, resource_for_url, key_name, schema):
+    def __init__(
+        self,
+        request,
+        query,
+        resource_for_url,
+        key_name,
+        schema,
+        cursor_columns=None,
+        url_values=None,
+        page_size=None,
+        descending=False,
+    ):
         self.request = request
         self.query = query
         self.resource_for_url = resource_for_url
         self.key_name = key_name
-        self.schema = schema
-        self.page_size = int(current_app.config['PAGINATION_PAGE_SIZE'])
+        self.schema = serializer_for(schema)
+        # columns that uniquely order the query, enabling keyset pagination
+        self.cursor_columns = cursor_columns
+        # walk the cursor columns from the highest values down
+        self.descending = descending
+        # extra values for the next/previous links, such as route arguments
+        self.url_values = url_values or {}
+        self.page_size = page_size or int(current_app.config['PAGINATION_PAGE_SIZE'])
         self.page_argument_name = current_app.config['PAGINATION_PAGE_ARGUMENT_NAME']
+        self.cursor_argument_name = current_app.config.get(
+            'PAGINATION_CURSOR_ARGUMENT_NAME', 'cursor'
+        )
+        self.count = get_count_strategy(current_app.config, resource_for_url)
 
     def paginate_query(self):
+        # Cursor mode is opt-in: clients send an empty cursor to get the first page
+        if self.cursor_columns and self.cursor_argument_name in self.request.args:
+            return self.paginate_query_by_cursor()
+
         # If no page number specified, we assume the request requires page # 1
         page_number = self.request.args.get(self.page_argument_name, 1, type=int)
-        paginated_objects = self.query.paginate(
-            page_number, per_page=self.page_size, error_out=False
+        page_number = max(page_number, 1)
+        # Fetch one extra row to find out whether there is a next page, and leave
+        # the total to the configured count strategy
+        objects = (
+            self.query.limit(self.page_size + 1)
+            .offset((page_number - 1) * self.page_size)
+            .all()
         )
-        objects = paginated_objects.items
-        if paginated_objects.has_prev:
+        has_next = len(objects) > self.page_size
+        objects = objects[: self.page_size]
+        if page_number > 1:
             previous_page_url = url_for(
-                self.resource_for_url, page=page_number - 1, _external=True
+                self.resource_for_url,
+                page=page_number - 1,
+                _external=True,
+                **self.url_values
             )
         else:
             previous_page_url = None
 
-        if paginated_objects.has_next:
+        if has_next:
             next_page_url = url_for(
-                self.resource_for_url, page=page_number + 1, _external=True
+                self.resource_for_url,
+                page=page_number + 1,
+                _external=True,
+                **self.url_values
             )
         else:
             next_page_url = None
 
+        # No need to count if the first page isn't full
+        if page_number == 1 and not has_next:
+            count, count_exact = len(objects), True
+        else:
+            count, count_exact = self.count(self.query)
+
+        dumped_objects = self.schema.dump(objects, many=True)
+        return {
+            self.key_name: dumped_objects,
+            'previous': previous_page_url,
+            'next': next_page_url,
+            'count': count,
+            'count_exact': count_exact,
+        }
+
+    def paginate_query_by_cursor(self):
+        cursor = self.request.args.get(self.cursor_argument_name)
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+        else:
+            direction, values = 'next', None
+
+        # Seek past the cursor instead of using OFFSET, so every page costs
+        # one index range scan no matter how deep it is
+        columns = tuple_(*self.cursor_columns)
+        query = self.query.order_by(None)
+        ascending = (direction == 'next') != self.descending
+        if values is not None:
+            if ascending:
+                query = query.filter(columns > tuple_(*values))
+            else:
+                query = query.filter(columns < tuple_(*values))
+        if ascending:
+            query = query.order_by(*[column.asc() for column in self.cursor_columns])
+        else:
+            query = query.order_by(*[column.desc() for column in self.cursor_columns])
+
+        # Fetch one extra row to find out whether there is another page
+        objects = query.limit(self.page_size + 1).all()
+        has_more = len(objects) > self.page_size
+        objects = objects[: self.page_size]
+        if direction == 'next':
+            has_prev = values is not None
+            has_next = has_more
+        else:
+            objects.reverse()
+            has_prev = has_more
+            has_next = True
+
+        if has_prev and objects:
+            previous_page_url = self.cursor_url('previous', objects[0])
+        else:
+            previous_page_url = None
+
+        if has_next and objects:
+            next_page_url = self.cursor_url('next', objects[-1])
+        else:
+            next_page_url = None
+
+        # An exact total would bring back the full COUNT(*) that cursor mode
+        # avoids, so it is only reported when the strategy makes it cheap
+        if self.count is exact_count:
+            count, count_exact = None, False
+        else:
+            count, count_exact = self.count(self.query)
+
         dumped_objects = self.schema.dump(objects, many=True)
         return {
             self.key_name: dumped_objects,
             'previous': previous_page_url,
             'next': next_page_url,
-            'count': paginated_objects.total,
+            'count': count,
+            'count_exact': count_exact,
         }
+
+    def cursor_url(self, direction, obj):
+        values = [getattr(obj, column.key) for column in self.cursor_columns]
+        url_values = dict(self.url_values)
+        url_values[self.cursor_argument_name] = self.encode_cursor(direction, values)
+        return url_for(self.resource_for_url, _external=True, **url_values)
+
+    @staticmethod
+    def encode_cursor(direction, values):
+        # datetimes are kept in their str() form, which compares correctly
+        # against stored timestamps on both PostgreSQL and SQLite
+        payload = json.dumps({'d': direction, 'v': values}, default=str)
+        return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            payload = json.loads(urlsafe_b64decode(cursor + padding))
+            direction, values = payload['d'], payload['v']
+        except (ValueError, TypeError, KeyError):
+            abort(HttpStatus.bad_request_400.value, message='Invalid cursor.')
+        if direction not in ('next', 'previous') or not isinstance(values, list):
+            abort(HttpStatus.bad_request_400.value, message='Invalid cursor.')
+        if len(values) != len(self.cursor_columns):
+            abort(HttpStatus.bad_request_400.value, message='Invalid cursor.')
+        return direction, values
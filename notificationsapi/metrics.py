@@ -0,0 +1,340 @@
+import hmac
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .models.base import recent_writers
+from .models.category import category_cache
+from .utils.counting import count_cache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield self.name + format_labels(self.labelnames, labels), value
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield self.name + format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # {labels: [count per bucket..., count above the last bucket, sum]}
+        self._values = {}
+        self._lock = Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(
+                (labels, list(state)) for labels, state in self._values.items()
+            )
+        for labels, state in values:
+            cumulative = 0
+            bounds = [str(bucket) for bucket in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, state):
+                cumulative += count
+                label_text = format_labels(self.labelnames, labels, [('le', bound)])
+                yield f'{self.name}_bucket{label_text}', cumulative
+            label_text = format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum{label_text}', state[-1]
+            yield f'{self.name}_count{label_text}', cumulative
+
+
+class Collected:
+    """Metric whose values are read from their source when rendered."""
+
+    def __init__(self, kind, name, documentation, labelnames, collect):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in sorted(self.collect().items()):
+            yield self.name + format_labels(self.labelnames, labels), value
+
+
+# the LRU caches of this process, by the name they're reported under
+caches = {
+    'category': category_cache,
+    'count': count_cache.entries,
+    'recent_writers': recent_writers,
+}
+
+
+def cache_lookups():
+    values = {}
+    for name, cache in caches.items():
+        stats = cache.stats()
+        values[name, 'hit'] = stats['hits']
+        values[name, 'miss'] = stats['misses']
+    return values
+
+
+def cache_stat(stat):
+    def collect():
+        return {(name,): cache.stats()[stat] for name, cache in caches.items()}
+
+    return collect
+
+
+requests_total = Counter(
+    'http_requests_total',
+    'Requests handled, by endpoint, method and status.',
+    ('endpoint', 'method', 'status'),
+)
+request_errors_total = Counter(
+    'http_request_errors_total',
+    'Requests that ended in a 5xx response.',
+    ('endpoint', 'method'),
+)
+request_duration = Histogram(
+    'http_request_duration_seconds',
+    'Time from the start of the request to the response.',
+    ('endpoint', 'method'),
+)
+request_sql_statements = Histogram(
+    'http_request_sql_statements',
+    'SQL statements executed per request.',
+    ('endpoint', 'method'),
+    buckets=STATEMENT_BUCKETS,
+)
+request_sql_duration = Histogram(
+    'http_request_sql_duration_seconds',
+    'Time spent executing SQL statements per request.',
+    ('endpoint', 'method'),
+)
+pool_checked_out = Gauge(
+    'db_pool_checked_out',
+    'Database connections checked out of the pools, against their size.',
+)
+pool_held_duration = Histogram(
+    'db_pool_connection_held_seconds', 'Time from a connection checkout to its checkin.'
+)
+auth_duration = Histogram(
+    'auth_duration_seconds', 'Time spent verifying credentials.', ('scheme',)
+)
+password_hash_queue_depth = Gauge(
+    'password_hash_queue_depth',
+    'Password hashes and checks queued or running in the process pool.',
+)
+password_hash_duration = Histogram(
+    'password_hash_duration_seconds',
+    'Time from submitting a password hash or check to its result.',
+    ('operation',),
+)
+
+cache_lookups_total = Collected(
+    'counter',
+    'cache_lookups_total',
+    'Lookups of the in-process caches, by result.',
+    ('cache', 'result'),
+    cache_lookups,
+)
+cache_evictions_total = Collected(
+    'counter',
+    'cache_evictions_total',
+    'Entries dropped from the in-process caches to stay within their size.',
+    ('cache',),
+    cache_stat('evictions'),
+)
+cache_entries = Collected(
+    'gauge',
+    'cache_entries',
+    'Entries held by the in-process caches, expired ones included.',
+    ('cache',),
+    cache_stat('size'),
+)
+
+registry = (
+    requests_total,
+    request_errors_total,
+    request_duration,
+    request_sql_statements,
+    request_sql_duration,
+    pool_checked_out,
+    pool_held_duration,
+    auth_duration,
+    password_hash_queue_depth,
+    password_hash_duration,
+    cache_lookups_total,
+    cache_evictions_total,
+    cache_entries,
+)
+
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for sample, value in metric.samples():
+            lines.append(f'{sample} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_query_start'].pop()
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_sql_statements += 1
+        g.metrics_sql_duration += time.perf_counter() - started
+
+
+def handle_error(exception_context):
+    # after_cursor_execute doesn't run for failed statements
+    start_times = exception_context.connection.info.get('metrics_query_start')
+    if start_times:
+        start_times.pop()
+
+
+def checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info['metrics_checked_out'] = time.perf_counter()
+    pool_checked_out.inc()
+
+
+def checkin(dbapi_connection, connection_record):
+    # no record for a detached connection, detach() counted it already
+    if connection_record is None:
+        return
+    started = connection_record.info.pop('metrics_checked_out', None)
+    if started is not None:
+        pool_checked_out.dec()
+        pool_held_duration.observe(time.perf_counter() - started)
+
+
+def detach(dbapi_connection, connection_record):
+    if connection_record.info.pop('metrics_checked_out', None) is not None:
+        pool_checked_out.dec()
+
+
+def start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_sql_statements = 0
+    g.metrics_sql_duration = 0.0
+
+
+def record_request(response):
+    if 'metrics_start' not in g:
+        return response
+    endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+    method = request.method
+    request_duration.observe(time.perf_counter() - g.metrics_start, endpoint, method)
+    request_sql_statements.observe(g.metrics_sql_statements, endpoint, method)
+    request_sql_duration.observe(g.metrics_sql_duration, endpoint, method)
+    requests_total.inc(endpoint, method, str(response.status_code))
+    if response.status_code >= 500:
+        request_errors_total.inc(endpoint, method)
+    return response
+
+
+def metrics_view():
+    # scrapers present METRICS_TOKEN, the endpoint isn't rate limited
+    authorization = request.headers.get('Authorization', '')
+    scheme, _, token = authorization.partition(' ')
+    expected = current_app.config['METRICS_TOKEN']
+    if scheme != 'Bearer' or not hmac.compare_digest(token, expected):
+        return Response(
+            'Unauthorized\n', 401, {'WWW-Authenticate': 'Bearer realm="metrics"'}
+        )
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(Engine, 'handle_error', handle_error)
+        # the pool events of every engine, the pools of disposed ones included
+        event.listen(Engine, 'checkout', checkout)
+        event.listen(Engine, 'checkin', checkin)
+        event.listen(Engine, 'detach', detach)
+    app.before_request(start_request)
+    app.after_request(record_request)
+    # not served without a token, the metrics name every endpoint and cache
+    if app.config.get('METRICS_TOKEN'):
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
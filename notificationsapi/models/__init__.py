@@ -1,7 +1,24 @@
-from .base import db, ma
+from .base import db, ma, recent_writers
+from .category import category_cache
+from .user import store_password_rehash
+from ..utils.counting import count_cache
 
 
 def init_app(app):
+    replica_uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if replica_uri:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds['replica'] = replica_uri
+        app.config['SQLALCHEMY_BINDS'] = binds
     db.init_app(app)
     ma.init_app(app)
+    category_cache.configure(
+        maxsize=app.config.get('CATEGORY_CACHE_SIZE', 1024),
+        ttl=app.config.get('CATEGORY_CACHE_TTL', 30),
+    )
+    count_cache.configure(maxsize=app.config.get('PAGINATION_COUNT_CACHE_SIZE', 1024))
+    recent_writers.configure(
+        maxsize=recent_writers.maxsize, ttl=app.config.get('REPLICA_STICKY_SECONDS', 5)
+    )
+    app.teardown_request(store_password_rehash)
     return db
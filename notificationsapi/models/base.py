@@ -1,18 +1,408 @@
-from flask_sqlalchemy import SQLAlchemy
+import sqlite3
+from itertools import chain
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
 from flask_marshmallow import Marshmallow
+from sqlalchemy import event, func, literal, orm, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import DateTime
+
+from ..utils.cache import LRUCache
+from ..utils.counting import count_cache
+
+# Clients that wrote recently, their reads stay on the primary until the
+# replica has caught up. Kept per process: with several workers a client may
+# still reach one that hasn't seen its write, size the window accordingly.
+recent_writers = LRUCache(maxsize=10000, ttl=5)
+
+
+def client_keys():
+    # Writes are tracked by user, anonymous ones (like signing up) by address,
+    # so the first token request of a new user still finds its row. Basic
+    # credentials are checked by a read, the address is all it has to go on.
+    keys = [f'address:{request.remote_addr}']
+    user = g.get('user')
+    if user is not None:
+        keys.insert(0, f'user:{user.id}')
+    return keys
+
+
+def record_client_write():
+    recent_writers.set(client_keys()[0], True)
+
+
+def reads_from_replica(app):
+    if 'replica' not in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        return False
+    if not has_request_context() or request.method not in ('GET', 'HEAD'):
+        return False
+    if 'reads_from_replica' in g:
+        return g.reads_from_replica
+    replica = all(recent_writers.get(key) is None for key in client_keys())
+    # decided for the rest of the request once the user is known
+    if 'user' in g:
+        g.reads_from_replica = replica
+    return replica
+
 
-db = SQLAlchemy()
+class RoutingSession(SignallingSession):
+    """Send the reads of GET requests to the replica bind, everything else to
+    the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        writing = (
+            self._flushing
+            or isinstance(clause, UpdateBase)
+            or 'written_tables' in self.info
+        )
+        if not writing and reads_from_replica(self.app):
+            return db.get_engine(self.app, bind='replica')
+        return super().get_bind(mapper, clause)
+
+    def uses_replica(self):
+        # Whether reads go to the replica now. Caches aren't filled from it: a
+        # write that just invalidated them may not have reached it yet.
+        return 'written_tables' not in self.info and reads_from_replica(self.app)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+db = RoutingSQLAlchemy()
 ma = Marshmallow()
 
 
+class TableVersion(db.Model):
+    """Write counter of every table, commit() bumps the ones it changed.
+
+    Listings build their ETag from the counters of the tables they show, a
+    primary key lookup instead of an aggregate over the rows.
+    """
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, server_default='0')
+
+
+@event.listens_for(TableVersion.__table__, 'after_create')
+def add_table_versions(target, connection, **kw):
+    # the migration inserts the same rows
+    connection.execute(
+        target.insert(), [{'name': name} for name in sorted(target.metadata.tables)]
+    )
+
+
+def table_versions(*models):
+    names = [model.__table__.name for model in models]
+    versions = dict(
+        db.session.query(TableVersion.name, TableVersion.version).filter(
+            TableVersion.name.in_(names)
+        )
+    )
+    return [versions.get(name) for name in names]
+
+
+def bump_table_versions(tables):
+    if not tables:
+        return
+    versions = TableVersion.__table__
+    # one statement locking the rows in name order, so writers can't deadlock
+    db.session.execute(
+        versions.update()
+        .where(versions.c.name.in_(sorted(table.name for table in tables)))
+        .values(version=versions.c.version + 1)
+    )
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def record_flushed_tables(session, flush_context):
+    # changes flushed before commit() ran, by autoflush for instance
+    instances = chain(session.new, session.dirty, session.deleted)
+    session.info.setdefault('changed_tables', set()).update(tables_of(instances))
+    # new instances have their ids by now
+    for operation, instances in (
+        ('created', session.new),
+        ('updated', session.dirty),
+        ('deleted', session.deleted),
+    ):
+        for instance in instances:
+            if getattr(instance, 'change_log', None) is None:
+                continue
+            if operation == 'updated' and not session.is_modified(instance):
+                continue
+            session.info.setdefault('pending_changes', []).append(
+                (type(instance), operation, [instance.id])
+            )
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def forget_flushed_tables(session):
+    session.info.pop('changed_tables', None)
+    session.info.pop('pending_changes', None)
+
+
+def dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+class utcnow(FunctionElement):
+    """The database's current time in UTC, without a time zone like the columns.
+
+    Unlike datetime.utcnow() it isn't a bound parameter, so statements using it
+    compile to the same SQL on every request.
+    """
+
+    type = DateTime()
+
+
+@compiles(utcnow)
+def compile_utcnow(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is in UTC already
+    return 'CURRENT_TIMESTAMP'
+
+
+@compiles(utcnow, 'postgresql')
+def compile_utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
+class seconds_from_now(FunctionElement):
+    """utcnow() plus a number of seconds, on the database clock."""
+
+    type = DateTime()
+    name = 'seconds_from_now'
+
+
+@compiles(seconds_from_now)
+def compile_seconds_from_now(element, compiler, **kw):
+    seconds = compiler.process(element.clauses, **kw)
+    return f"datetime(CURRENT_TIMESTAMP, {seconds} || ' seconds')"
+
+
+@compiles(seconds_from_now, 'postgresql')
+def compile_seconds_from_now_postgresql(element, compiler, **kw):
+    seconds = compiler.process(element.clauses, **kw)
+    return f"TIMEZONE('utc', CURRENT_TIMESTAMP) + {seconds} * interval '1 second'"
+
+
+def is_unique_violation(error):
+    # psycopg2 reports SQLSTATE 23505, sqlite3 only has the message to go on
+    if getattr(error.orig, 'pgcode', None) == '23505':
+        return True
+    return 'UNIQUE constraint' in str(error.orig)
+
+
+def is_foreign_key_violation(error):
+    if getattr(error.orig, 'pgcode', None) == '23503':
+        return True
+    return 'FOREIGN KEY constraint' in str(error.orig)
+
+
+@event.listens_for(Engine, 'connect')
+def enable_foreign_keys(dbapi_connection, connection_record):
+    # SQLite only enforces foreign keys when a connection asks for it
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA foreign_keys = ON')
+
+
+def record_write(table):
+    # tables written with Core statements, their cached counts go stale on commit
+    db.session.info.setdefault('written_tables', set()).add(table)
+
+
+def record_change(model, operation, ids):
+    # ids is a list of primary keys or a SELECT of them, commit() writes the
+    # change log rows in the same transaction
+    if model.change_log is not None:
+        db.session.info.setdefault('pending_changes', []).append(
+            (model, operation, ids)
+        )
+
+
+def record_inserted(model, rows):
+    # Core inserts don't hand back ids, the rows are found again by the first
+    # unique column instead
+    if model.change_log is not None:
+        table = model.__table__
+        key = next(column for column in table.columns if column.unique)
+        record_change(
+            model,
+            'created',
+            select([table.c.id]).where(key.in_({row[key.name] for row in rows})),
+        )
+
+
+# pg_advisory_xact_lock() key serializing the change log writers
+CHANGE_LOG_LOCK = 0x6E6F7469
+
+
+def lock_change_log():
+    # held until the transaction ends, taking it again doesn't wait
+    if dialect_name() == 'postgresql':
+        db.session.execute(select([func.pg_advisory_xact_lock(CHANGE_LOG_LOCK)]))
+
+
+def log_changes_now(model, operation, ids):
+    """Write the change log rows for the primary keys the SELECT ids returns
+    with one INSERT ... SELECT, for rows a statement is about to delete before
+    log_changes() could read them.
+    """
+    if model.change_log is None:
+        return
+    lock_change_log()
+    ids = ids.alias()
+    values = model.change_log.row(literal(operation), *ids.c)
+    db.session.execute(
+        model.change_log.__table__.insert().from_select(
+            list(values), select(list(values.values())).order_by(*ids.c)
+        )
+    )
+
+
+def log_changes():
+    """Write the change log rows of the current transaction.
+
+    Runs right before COMMIT. On PostgreSQL the sequence numbers are handed
+    out under a transaction lock, so they follow commit order and a reader
+    never sees a later sequence number before an earlier one commits.
+    """
+    session = db.session
+    # the changes of mapped instances are recorded on flush, see
+    # record_flushed_tables()
+    session.flush()
+    pending = session.info.pop('pending_changes', None)
+    if not pending:
+        return
+    lock_change_log()
+    for model, operation, ids in pending:
+        if not isinstance(ids, list):
+            ids = sorted(row[0] for row in session.execute(ids))
+        if ids:
+            session.execute(
+                model.change_log.__table__.insert(),
+                [model.change_log.row(operation, id) for id in ids],
+            )
+
+
+def tables_of(instances):
+    return {instance.__table__ for instance in instances}
+
+
+def referencing_tables(tables):
+    # rows in these tables may go away through ON DELETE CASCADE
+    return {
+        table
+        for table in db.metadata.tables.values()
+        if any(fk.column.table in tables for fk in table.foreign_keys)
+    }
+
+
 class ResourceAddUpdateDelete:
+    # model logging the inserts, updates and deletes of this one, see log_changes()
+    change_log = None
+
     def add(self, resource):
         db.session.add(resource)
-        return db.session.commit()
+        return self.commit()
 
     def update(self):
-        return db.session.commit()
+        # Bump the row version in SQL so concurrent updates can't lose a bump
+        version = getattr(type(self), 'version', None)
+        if version is not None:
+            self.version = version + 1
+        return self.commit()
 
     def delete(self, resource):
         db.session.delete(resource)
-        return db.session.commit()
+        return self.commit()
+
+    @classmethod
+    def insert_values(cls, values):
+        # the values add_unique() and add_many_unique() insert, models add the
+        # columns computed in SQL
+        return values
+
+    @classmethod
+    def add_many(cls, rows):
+        # One executemany INSERT inside the current transaction, commit() ends it
+        db.session.execute(cls.__table__.insert(), rows)
+        record_write(cls.__table__)
+        record_inserted(cls, rows)
+
+    @classmethod
+    def add_unique(cls, **values):
+        # Insert relying on the table's unique constraints instead of checking first.
+        # Returns the new row as a dict, or None when it would be a duplicate.
+        table = cls.__table__
+        values = cls.insert_values(values)
+        if dialect_name() == 'postgresql':
+            statement = (
+                postgresql.insert(table)
+                .values(**values)
+                .on_conflict_do_nothing()
+                .returning(*table.columns)
+            )
+            row = db.session.execute(statement).first()
+        else:
+            try:
+                result = db.session.execute(table.insert().values(**values))
+            except IntegrityError as err:
+                if is_unique_violation(err):
+                    return None
+                raise
+            # no RETURNING support here, read back the server side defaults
+            primary_key = result.inserted_primary_key[0]
+            row = db.session.execute(
+                table.select().where(table.c.id == primary_key)
+            ).first()
+        if row is None:
+            return None
+        record_write(table)
+        record_change(cls, 'created', [row['id']])
+        return dict(row)
+
+    @classmethod
+    def add_many_unique(cls, rows):
+        # add_unique() for several rows, returns the inserted ones as dicts and
+        # leaves out the duplicates. One INSERT on PostgreSQL, a row at a time
+        # elsewhere.
+        if dialect_name() != 'postgresql':
+            inserted = (cls.add_unique(**values) for values in rows)
+            return [row for row in inserted if row is not None]
+        table = cls.__table__
+        statement = (
+            postgresql.insert(table)
+            .values([cls.insert_values(values) for values in rows])
+            .on_conflict_do_nothing()
+            .returning(*table.columns)
+        )
+        inserted = [dict(row) for row in db.session.execute(statement)]
+        if inserted:
+            record_write(table)
+            record_change(cls, 'created', [row['id'] for row in inserted])
+        return inserted
+
+    @staticmethod
+    def commit():
+        deleted_tables = tables_of(db.session.deleted)
+        tables = tables_of(db.session.new) | deleted_tables
+        tables |= referencing_tables(deleted_tables)
+        tables |= db.session.info.pop('written_tables', set())
+        log_changes()
+        db.session.flush()
+        # updates can move rows in and out of filtered counts as well
+        tables |= db.session.info.pop('changed_tables', set())
+        bump_table_versions(tables)
+        result = db.session.commit()
+        count_cache.invalidate(*[table.name for table in tables])
+        if has_request_context():
+            record_client_write()
+        return result
@@ -1,12 +1,43 @@
+from datetime import datetime
+
 from marshmallow import fields, validate
+from sqlalchemy import inspect, select
+
+from .base import (
+    db as orm,
+    ma,
+    log_changes_now,
+    record_change,
+    record_write,
+    utcnow,
+    ResourceAddUpdateDelete,
+)
+from .notification import Notification
+from ..utils.cache import LRUCache
 
-from .base import db as orm, ma, ResourceAddUpdateDelete
+# Read-through cache of category rows (as dicts), keyed by ('name', name) and
+# ('id', id). Only committed rows are cached. Each process has its own and only
+# the writing one invalidates it, others see a change after the ttl. The id
+# entries are tagged with the table version they were read at and only used
+# while it's current, see get_current().
+category_cache = LRUCache(ttl=30)
 
 
 # Notification Category Model
 class NotificationCategory(orm.Model, ResourceAddUpdateDelete):
     id = orm.Column(orm.Integer, primary_key=True)
     name = orm.Column(orm.String(150), unique=True, nullable=False)
+    # bumped by ResourceAddUpdateDelete.update(), feeds the ETag
+    version = orm.Column(orm.Integer, nullable=False, default=1, server_default='1')
+    updated_at = orm.Column(
+        orm.TIMESTAMP,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        # in UTC like the application writes it, CURRENT_TIMESTAMP is local time
+        # on PostgreSQL
+        server_default=utcnow(),
+    )
 
     @classmethod
     def is_name_unique(cls, id, name):
@@ -21,6 +52,95 @@ class NotificationCategory(orm.Model, ResourceAddUpdateDelete):
             else:
                 return False
 
+    @classmethod
+    def cached_query(cls):
+        return cls.query.with_entities(cls.id, cls.name, cls.version, cls.updated_at)
+
+    @staticmethod
+    def cache(category):
+        if orm.session().uses_replica():
+            return
+        category_cache.set(('name', category['name']), category)
+
+    @classmethod
+    def get_current(cls, id, table_version):
+        """Category id as of table_version, the notification_category version
+        read before calling. A cached row read at another version is read again.
+        """
+        cached = category_cache.get(('id', id))
+        if table_version is not None and cached is not None:
+            cached_version, category = cached
+            if cached_version == table_version:
+                return dict(category)
+        row = cls.cached_query().filter_by(id=id).first()
+        if row is None:
+            category_cache.invalidate(('id', id))
+            return None
+        category = row._asdict()
+        cls.cache(category)
+        if table_version is not None and not orm.session().uses_replica():
+            category_cache.set(('id', id), (table_version, category))
+        return dict(category)
+
+    @classmethod
+    def get_cached_by_name(cls, name):
+        category = category_cache.get(('name', name))
+        if category is None:
+            row = cls.cached_query().filter_by(name=name).first()
+            if row is None:
+                return None
+            category = row._asdict()
+            cls.cache(category)
+        return dict(category)
+
+    @classmethod
+    def get_or_add(cls, name):
+        category = cls.get_cached_by_name(name)
+        if category is not None:
+            return category
+        # not cached: the insert may still be rolled back by the caller
+        category = cls.add_unique(name=name)
+        if category is None:
+            # a concurrent request created it between our SELECT and INSERT
+            category = cls.get_cached_by_name(name)
+        return category
+
+    def stale_cache_keys(self):
+        # the current name plus the one it had before a pending rename
+        names = {self.name, *inspect(self).attrs.name.history.deleted}
+        return [('id', self.id)] + [('name', name) for name in names]
+
+    def update(self):
+        stale_keys = self.stale_cache_keys()
+        if inspect(self).attrs.name.history.deleted:
+            # the notifications show the name of their category
+            notification = Notification.__table__
+            record_change(
+                Notification,
+                'updated',
+                select([notification.c.id]).where(
+                    notification.c.notification_category_id == self.id
+                ),
+            )
+        result = super().update()
+        category_cache.invalidate(*stale_keys)
+        return result
+
+    def delete(self, resource):
+        stale_keys = resource.stale_cache_keys()
+        # deleted here rather than by ON DELETE CASCADE, so the change log gets
+        # a tombstone for each of them
+        notification = Notification.__table__
+        in_category = notification.c.notification_category_id == resource.id
+        log_changes_now(
+            Notification, 'deleted', select([notification.c.id]).where(in_category)
+        )
+        if orm.session.execute(notification.delete().where(in_category)).rowcount:
+            record_write(notification)
+        result = super().delete(resource)
+        category_cache.invalidate(*stale_keys)
+        return result
+
 
 # Notification Category Schema
 class NotificationCategorySchema(ma.Schema):
@@ -1,10 +1,71 @@
+from datetime import datetime, timedelta
+
 from marshmallow import fields, pre_load, validate, ValidationError
+from sqlalchemy import DDL, column, event, func, literal_column, table
+
+from .base import (
+    db as orm,
+    ma,
+    dialect_name,
+    seconds_from_now,
+    utcnow,
+    ResourceAddUpdateDelete,
+)
+
+
+# Creates, updates and deletes of notifications in commit order, read by
+# /notifications/changes. There's no foreign key: deletes leave a tombstone.
+class NotificationChange(orm.Model):
+    sequence = orm.Column(orm.Integer, primary_key=True)
+    notification_id = orm.Column(orm.Integer, nullable=False)
+    operation = orm.Column(orm.String(7), nullable=False)
+    # in UTC like the retention cutoff, see expiry.prune_changes_batch()
+    changed_at = orm.Column(orm.TIMESTAMP, nullable=False, server_default=utcnow())
+
+    @staticmethod
+    def row(operation, id):
+        return {'operation': operation, 'notification_id': id}
+
+
+# Sequence of the newest pruned change, a cursor before it skips pruned changes
+class NotificationChangeWatermark(orm.Model):
+    id = orm.Column(orm.Integer, primary_key=True)
+    sequence = orm.Column(orm.Integer, nullable=False, server_default='0')
+
 
-from .base import db as orm, ma, ResourceAddUpdateDelete
+@event.listens_for(NotificationChangeWatermark.__table__, 'after_create')
+def add_change_watermark(target, connection, **kw):
+    # the migration inserts the same row
+    connection.execute(target.insert(), {'id': 1})
 
 
 # Notfication Model
 class Notification(orm.Model, ResourceAddUpdateDelete):
+    __table_args__ = (
+        # keyset pagination of /notifications
+        orm.Index('ix_notification_creation_date_id', 'creation_date', 'id'),
+        # the notifications backref (ordered by message) and foreign key lookups
+        orm.Index(
+            'ix_notification_category_id_message', 'notification_category_id', 'message'
+        ),
+        # /notifications filtered by category
+        orm.Index(
+            'ix_notification_category_id_creation_date_id',
+            'notification_category_id',
+            'creation_date',
+            'id',
+        ),
+        # /notifications filtered by displayed_once
+        orm.Index(
+            'ix_notification_displayed_once_creation_date_id',
+            'displayed_once',
+            'creation_date',
+            'id',
+        ),
+        # /notifications sorted or filtered by displayed_times
+        orm.Index('ix_notification_displayed_times_id', 'displayed_times', 'id'),
+    )
+
     id = orm.Column(orm.Integer, primary_key=True)
     message = orm.Column(orm.String(250), unique=True, nullable=False)
     ttl = orm.Column(orm.Integer, nullable=False)
@@ -23,7 +84,68 @@ class Notification(orm.Model, ResourceAddUpdateDelete):
         ),
     )
     displayed_times = orm.Column(orm.Integer, nullable=False, server_default='0')
-    displayed_once = orm.Column(orm.Boolean, nullable=False, server_default='False')
+    displayed_once = orm.Column(orm.Boolean, nullable=False, server_default=orm.false())
+    # bumped by ResourceAddUpdateDelete.update(), feeds the ETag
+    version = orm.Column(orm.Integer, nullable=False, default=1, server_default='1')
+    updated_at = orm.Column(
+        orm.TIMESTAMP,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        # in UTC like the application writes it, CURRENT_TIMESTAMP is local time
+        # on PostgreSQL
+        server_default=utcnow(),
+    )
+    # creation_date + ttl in UTC, kept as a column so expiry is an index range scan.
+    # Set on the database clock by insert_values(), bulk loads compute it.
+    expires_at = orm.Column(orm.TIMESTAMP, nullable=False, index=True)
+
+    change_log = NotificationChange
+
+    @classmethod
+    def insert_values(cls, values):
+        # on the clock active() compares against
+        if 'expires_at' in values:
+            return values
+        return dict(values, expires_at=seconds_from_now(values['ttl']))
+
+    @classmethod
+    def active(cls):
+        return cls.expires_at > utcnow()
+
+    @classmethod
+    def next_expiry(cls):
+        # listings of active notifications change when this one expires
+        return (
+            orm.session.query(cls.expires_at)
+            .filter(cls.active())
+            .order_by(cls.expires_at)
+            .limit(1)
+            .scalar()
+        )
+
+    def set_ttl(self, ttl):
+        self.expires_at += timedelta(seconds=ttl - self.ttl)
+        self.ttl = ttl
+
+    @classmethod
+    def search(cls, query, terms):
+        """Restrict query to notifications matching terms, best matches first."""
+        if dialect_name() == 'postgresql':
+            tsquery = func.plainto_tsquery('english', terms)
+            search_vector = literal_column('notification.search_vector')
+            return query.filter(search_vector.op('@@')(tsquery)).order_by(
+                func.ts_rank(search_vector, tsquery).desc(), cls.id
+            )
+        # every term is quoted, so user input never reads as an FTS5 operator
+        match = ' '.join(
+            '"{}"'.format(term.replace('"', '""')) for term in terms.split()
+        )
+        return (
+            query.join(notification_search, notification_search.c.rowid == cls.id)
+            .filter(literal_column('notification_search').op('MATCH')(match))
+            .order_by(notification_search.c.rank, cls.id)
+        )
 
     @classmethod
     def is_message_unique(cls, id, message):
@@ -37,6 +159,66 @@ class Notification(orm.Model, ResourceAddUpdateDelete):
                 return False
 
 
+# Full-text search over messages. PostgreSQL keeps a generated tsvector column
+# with a GIN index, SQLite an external content FTS5 table synced by triggers.
+# Neither is mapped; the same DDL is in the migration.
+notification_search = table('notification_search', column('rowid'), column('rank'))
+
+search_ddl = {
+    'postgresql': [
+        "ALTER TABLE notification ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english', message)) STORED",
+        'CREATE INDEX ix_notification_search_vector ON notification '
+        'USING gin (search_vector)',
+    ],
+    'sqlite': [
+        'CREATE VIRTUAL TABLE notification_search USING fts5('
+        "message, content='notification', content_rowid='id', "
+        "tokenize='porter unicode61')",
+        'CREATE TRIGGER notification_search_insert AFTER INSERT ON notification '
+        'BEGIN INSERT INTO notification_search(rowid, message) '
+        'VALUES (new.id, new.message); END',
+        'CREATE TRIGGER notification_search_delete AFTER DELETE ON notification '
+        'BEGIN INSERT INTO notification_search(notification_search, rowid, message) '
+        "VALUES ('delete', old.id, old.message); END",
+        'CREATE TRIGGER notification_search_update '
+        'AFTER UPDATE OF message ON notification '
+        'BEGIN INSERT INTO notification_search(notification_search, rowid, message) '
+        "VALUES ('delete', old.id, old.message); "
+        'INSERT INTO notification_search(rowid, message) '
+        'VALUES (new.id, new.message); END',
+    ],
+}
+
+for dialect, statements in search_ddl.items():
+    for statement in statements:
+        event.listen(
+            Notification.__table__,
+            'after_create',
+            DDL(statement).execute_if(dialect=dialect),
+        )
+event.listen(
+    Notification.__table__,
+    'after_drop',
+    DDL('DROP TABLE IF EXISTS notification_search').execute_if(dialect='sqlite'),
+)
+
+
+# Expired notifications moved out of the notification table by the reaper
+class NotificationArchive(orm.Model):
+    id = orm.Column(orm.Integer, primary_key=True, autoincrement=False)
+    message = orm.Column(orm.String(250), nullable=False)
+    ttl = orm.Column(orm.Integer, nullable=False)
+    creation_date = orm.Column(orm.TIMESTAMP)
+    notification_category_id = orm.Column(orm.Integer, nullable=False)
+    displayed_times = orm.Column(orm.Integer, nullable=False)
+    displayed_once = orm.Column(orm.Boolean, nullable=False)
+    expires_at = orm.Column(orm.TIMESTAMP, nullable=False)
+    archived_at = orm.Column(
+        orm.TIMESTAMP, nullable=False, server_default=orm.func.current_timestamp()
+    )
+
+
 # validation helpers
 def data_required(data):
     if not data:
@@ -1,11 +1,17 @@
 import re
-from passlib.apps import custom_app_context as password_context
+from flask import current_app, g
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from marshmallow import fields, validate
+from sqlalchemy.exc import SQLAlchemyError
 
 from .base import ma, db as orm, ResourceAddUpdateDelete
+from ..passwords import hash_password, verify_password
 
 
 class User(orm.Model, ResourceAddUpdateDelete):
+    # name lookups during Basic auth are served by the unique constraint's index
+    __table_args__ = (orm.Index('ix_user_creation_date_id', 'creation_date', 'id'),)
+
     id = orm.Column(orm.Integer, primary_key=True)
     name = orm.Column(orm.String(50), unique=True, nullable=False)
     password_hash = orm.Column(orm.String(120), nullable=False)
@@ -14,7 +20,32 @@ class User(orm.Model, ResourceAddUpdateDelete):
     )
 
     def verify_password(self, password):
-        return password_context.verify(password, self.password_hash)
+        matches, new_hash = verify_password(password, self.password_hash)
+        if matches and new_hash is not None:
+            # stored with outdated hash parameters, upgrade it while we have
+            # the password; written by store_password_rehash() after the request,
+            # so checking the credentials of a read never writes
+            g.password_rehash = (self.id, self.password_hash, new_hash)
+        return matches
+
+    def generate_auth_token(self):
+        serializer = _token_serializer()
+        return serializer.dumps({'id': self.id, 'name': self.name})
+
+    @classmethod
+    def verify_auth_token(cls, token):
+        serializer = _token_serializer()
+        try:
+            data = serializer.loads(
+                token, max_age=current_app.config['AUTH_TOKEN_EXPIRATION']
+            )
+        except (BadSignature, SignatureExpired):
+            return None
+        # The signature already proves who the user is, so we build a detached
+        # instance from the payload instead of hitting the database. Deleting
+        # the user or changing the password doesn't revoke the token, see
+        # AUTH_TOKEN_EXPIRATION.
+        return cls(id=data['id'], name=data['name'])
 
     def check_password_strength_and_hash_if_ok(self, password):
         if len(password) < 8:
@@ -36,10 +67,40 @@ class User(orm.Model, ResourceAddUpdateDelete):
         if re.search(r"[ !#$%&'()*+,-./[\\\]^_`{|}~" + r'"]', password) is None:
             return ('The password must include at least one symbol', False)
 
-        self.password_hash = password_context.hash(password)
+        self.password_hash = hash_password(password)
         return ('', True)
 
 
+def store_password_rehash(exception=None):
+    """Store the hash verify_password() upgraded, in a transaction of its own.
+
+    Runs on request teardown. Failing to store it mustn't fail the login, the
+    next one tries again.
+    """
+    rehash = g.pop('password_rehash', None)
+    if rehash is None:
+        return
+    id, old_hash, new_hash = rehash
+    user = User.__table__
+    try:
+        with orm.get_engine(current_app).begin() as connection:
+            # unless the password was changed in the meantime
+            connection.execute(
+                user.update()
+                .where(user.c.id == id)
+                .where(user.c.password_hash == old_hash)
+                .values(password_hash=new_hash)
+            )
+    except SQLAlchemyError:
+        current_app.logger.exception('Password rehash of %s failed', id)
+
+
+def _token_serializer():
+    return URLSafeTimedSerializer(
+        current_app.config['SECRET_KEY'], salt='notificationsapi-auth-token'
+    )
+
+
 class UserSchema(ma.Schema):
     id = fields.Integer(dump_only=True)
     name = fields.String(required=True, validate=validate.Length(3))
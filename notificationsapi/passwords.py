@@ -0,0 +1,129 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import BoundedSemaphore, Lock
+
+from flask import current_app
+from passlib.context import CryptContext
+from werkzeug.exceptions import ServiceUnavailable
+
+from .metrics import password_hash_duration, password_hash_queue_depth
+
+# CryptContext of a pool worker process, set by configure_worker()
+worker_context = None
+
+
+class PasswordHashingBusy(ServiceUnavailable):
+    description = 'Too many password checks in progress, try again later.'
+
+    def get_headers(self, environ=None):
+        # set by hand, ServiceUnavailable only takes retry_after from Werkzeug 1.0
+        return super().get_headers(environ) + [('Retry-After', '1')]
+
+
+def make_context(schemes, rounds):
+    # The first scheme hashes new passwords. Hashes of the other schemes, or
+    # with other rounds, still verify but need an update.
+    scheme = schemes[0]
+    return CryptContext(
+        schemes=list(schemes),
+        default=scheme,
+        deprecated='auto',
+        **{
+            f'{scheme}__default_rounds': rounds,
+            f'{scheme}__min_rounds': rounds,
+            f'{scheme}__max_rounds': rounds,
+        },
+    )
+
+
+def configure_worker(schemes, rounds):
+    global worker_context
+    worker_context = make_context(schemes, rounds)
+
+
+def hash_with(context, password):
+    return context.hash(password)
+
+
+def verify_with(context, password, password_hash):
+    # (matches, new hash when the stored one uses outdated parameters or None)
+    return context.verify_and_update(password, password_hash)
+
+
+def call_in_worker(function, *args):
+    return function(worker_context, *args)
+
+
+def hash_in_worker(password):
+    return worker_context.hash(password)
+
+
+class PasswordHasher:
+    """Hash and verify passwords in a pool of worker processes.
+
+    The request thread only waits on the result, so a slow hash doesn't hold
+    the GIL. At most max_pending hashes are pending for the hasher as a whole,
+    however many worker processes it has; past that, callers wait up to
+    timeout seconds for a slot and then get a 503.
+    """
+
+    def __init__(self, schemes, rounds, processes=0, max_pending=64, timeout=10):
+        self.settings = (tuple(schemes), rounds)
+        # used directly when processes is 0
+        self.context = make_context(*self.settings)
+        self.processes = processes
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = Lock()
+
+    def executor(self):
+        # created in the process that uses it, after the server forked
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    self.processes, initializer=configure_worker, initargs=self.settings
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, operation, function, *args):
+        with password_hash_duration.time(operation):
+            if not self.processes:
+                return function(self.context, *args)
+            if not self._slots.acquire(timeout=self.timeout):
+                raise PasswordHashingBusy()
+            password_hash_queue_depth.inc()
+            try:
+                future = self.executor().submit(call_in_worker, function, *args)
+                return future.result()
+            finally:
+                password_hash_queue_depth.dec()
+                self._slots.release()
+
+    def hash(self, password):
+        return self.run('hash', hash_with, password)
+
+    def verify(self, password, password_hash):
+        return self.run('verify', verify_with, password, password_hash)
+
+
+def hash_password(password):
+    return current_app.extensions['password_hasher'].hash(password)
+
+
+def verify_password(password, password_hash):
+    return current_app.extensions['password_hasher'].verify(password, password_hash)
+
+
+def init_app(app):
+    hasher = PasswordHasher(
+        app.config.get('PASSWORD_HASH_SCHEMES', ('sha512_crypt', 'sha256_crypt')),
+        app.config.get('PASSWORD_HASH_ROUNDS', 656_000),
+        processes=app.config.get('PASSWORD_HASH_PROCESSES', 0),
+        max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING', 64),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10),
+    )
+    app.extensions['password_hasher'] = hasher
+    return hasher
@@ -0,0 +1,218 @@
+import math
+import time
+from threading import BoundedSemaphore, Lock
+from urllib.parse import urlsplit
+
+from flask import current_app, g, jsonify, request
+from werkzeug.exceptions import TooManyRequests
+
+from .models.user import User
+from .utils.cache import LRUCache
+from .utils.http_status import HttpStatus
+
+# endpoints that cost a password hash, each with a bucket of its own
+PASSWORD_ENDPOINTS = {
+    ('POST', 'user.userlistresource'): 'signup',
+    ('GET', 'user.usertokenresource'): 'token',
+}
+
+# long lived streams would hold a concurrency slot each for their lifetime
+UNLIMITED_ENDPOINTS = {'notification.notificationstreamresource', 'metrics'}
+
+
+class RateLimitExceeded(TooManyRequests):
+    description = 'Rate limit exceeded, slow down.'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+    def get_headers(self, environ=None):
+        # set by hand, TooManyRequests only takes retry_after from Werkzeug 1.0
+        retry_after = str(max(math.ceil(self.wait), 1))
+        return super().get_headers(environ) + [('Retry-After', retry_after)]
+
+
+class MemoryStore:
+    """Token buckets of this process. Buckets left alone long enough to refill
+    are dropped, a missing bucket is a full one.
+    """
+
+    def __init__(self, maxsize=100_000, clock=time.time):
+        self.buckets = LRUCache(maxsize=maxsize, ttl=3600)
+        self.clock = clock
+        self._lock = Lock()
+
+    def take(self, key, rate, burst):
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self.buckets.get(key) or (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets.set(key, (tokens, now))
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+class RedisStore:
+    """Token buckets shared by every worker, updated atomically by a script."""
+
+    script = '''
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+'''
+
+    def __init__(self, uri):
+        # optional dependency, only needed for a shared store
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                f'RATELIMIT_STORAGE_URI {uri} needs the redis package, '
+                'install it with pip install redis'
+            ) from None
+
+        self.client = redis.StrictRedis.from_url(uri)
+        self.take_token = self.client.register_script(self.script)
+
+    def take(self, key, rate, burst):
+        allowed, tokens = self.take_token(
+            keys=[f'ratelimit:{key}'], args=[rate, burst, time.time()]
+        )
+        tokens = float(tokens)
+        return bool(allowed), 0 if allowed else (1 - tokens) / rate
+
+
+def make_store(uri):
+    if urlsplit(uri).scheme in ('redis', 'rediss', 'unix'):
+        return RedisStore(uri)
+    return MemoryStore()
+
+
+class RateLimiter:
+    """Per client token buckets, one per endpoint class, and a cap on the
+    requests this process works on at once. Both are checked before the
+    request reaches a resource, so rejected requests never touch the database.
+    Basic credentials are unverified at that point: they spend a token of the
+    small login bucket of their address before the password is hashed, and
+    one of the user's bucket from limit_user() once it's checked. Wrong
+    passwords can't drain the bucket of the user they name.
+    """
+
+    def __init__(self, store, rates, max_concurrency=0):
+        self.store = store
+        # {endpoint class: (requests per second, burst)}
+        self.rates = rates
+        self.slots = BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    @staticmethod
+    def endpoint_class():
+        endpoint = request.url_rule.endpoint if request.url_rule else None
+        password_class = PASSWORD_ENDPOINTS.get((request.method, endpoint))
+        if password_class is not None:
+            return password_class
+        return 'read' if request.method in ('GET', 'HEAD') else 'write'
+
+    def bucket(self):
+        # (endpoint class, client) charged before the request reaches a
+        # resource. Bearer tokens are checked without the database and name the
+        # user that g.user will hold. Signups and anonymous requests count
+        # against the address.
+        endpoint_class = self.endpoint_class()
+        authorization = request.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            user = User.verify_auth_token(authorization.partition(' ')[2])
+            if user is not None:
+                return endpoint_class, f'user:{user.id}'
+        elif (
+            request.authorization is not None
+            and request.url_rule is not None
+            and endpoint_class != 'signup'
+        ):
+            return 'login', f'address:{request.remote_addr}'
+        return endpoint_class, f'address:{request.remote_addr}'
+
+    @staticmethod
+    def exempt():
+        endpoint = request.url_rule.endpoint if request.url_rule else None
+        return endpoint in UNLIMITED_ENDPOINTS or request.method == 'OPTIONS'
+
+    def take(self, client, endpoint_class=None):
+        endpoint_class = endpoint_class or self.endpoint_class()
+        rate, burst = self.rates[endpoint_class]
+        return self.store.take(f'{endpoint_class}:{client}', rate, burst)
+
+    def before_request(self):
+        if self.exempt():
+            return None
+        # the slot comes first, a request shed with a 503 keeps its token
+        if self.slots is not None:
+            if not self.slots.acquire(blocking=False):
+                return rejection(
+                    HttpStatus.service_unavailable_503,
+                    'The server is busy, try again later.',
+                    1,
+                )
+            g.ratelimit_slot = True
+        endpoint_class, client = self.bucket()
+        allowed, retry_after = self.take(client, endpoint_class)
+        if not allowed:
+            return rejection(
+                HttpStatus.too_many_requests_429,
+                'Rate limit exceeded, slow down.',
+                retry_after,
+            )
+        return None
+
+    def limit_user(self, user_id):
+        if self.exempt():
+            return
+        allowed, retry_after = self.take(f'user:{user_id}')
+        if not allowed:
+            raise RateLimitExceeded(retry_after)
+
+    def teardown_request(self, exception=None):
+        if g.pop('ratelimit_slot', False):
+            self.slots.release()
+
+
+def rejection(status, message, retry_after):
+    response = jsonify(message=message)
+    response.status_code = status.value
+    response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+def limit_user(user_id):
+    """Charge a request to the bucket of the user its Basic credentials were
+    verified for. Raises RateLimitExceeded when the bucket is empty.
+    """
+    limiter = current_app.extensions.get('rate_limiter')
+    if limiter is not None:
+        limiter.limit_user(user_id)
+
+
+def init_app(app):
+    if not app.config.get('RATELIMIT_ENABLED', False):
+        return None
+    limiter = RateLimiter(
+        make_store(app.config.get('RATELIMIT_STORAGE_URI', 'memory://')),
+        app.config['RATELIMIT_RATES'],
+        max_concurrency=app.config.get('RATELIMIT_MAX_CONCURRENCY', 0),
+    )
+    app.before_request(limiter.before_request)
+    app.teardown_request(limiter.teardown_request)
+    app.extensions['rate_limiter'] = limiter
+    return limiter
@@ -1,12 +1,16 @@
-from flask import Blueprint, request, make_response
-from flask_restful import Api, Resource
+from flask import Blueprint, request, make_response, current_app
+from flask_restful import Api, Resource, abort
 from sqlalchemy.exc import SQLAlchemyError
 from marshmallow import ValidationError
 
 from ..utils.http_status import HttpStatus
-from ..models.base import db as orm
+from ..utils.conditional import make_etag, not_modified, validator_headers
+from ..models.base import db as orm, table_versions
 from ..models.category import NotificationCategory, NotificationCategorySchema
-from ..models.notification import NotificationSchema
+from ..models.notification import Notification, NotificationSchema
+from ..utils.fieldsets import column_options, requested_fields, sparse_schema
+from ..utils.serialization import serializer_for
+from ..helpers import PaginationHelper
 from .user import AuthenticationRequiredResource
 
 
@@ -20,14 +24,67 @@ category = Api(bp)
 duplicate_category_message = 'A notification category of name "{}" already exists.'
 
 
+def category_notifications(id):
+    return Notification.query.filter(
+        Notification.notification_category_id == id, Notification.active()
+    )
+
+
+def category_response(notification_category, id, fields=None):
+    category_data = sparse_schema(category_schema, fields).dump(notification_category)
+    # ?notifications=false returns the category alone
+    if request.args.get('notifications', 'true').lower() in ('0', 'false', 'no'):
+        return {'category': category_data}
+
+    # The nested notifications are always a bounded keyset page, so the cost of
+    # a detail response doesn't depend on the size of the category
+    max_limit = int(current_app.config['PAGINATION_PAGE_SIZE'])
+    url_values = {'id': id}
+    if fields is not None:
+        url_values['fields'] = ','.join(fields)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), max_limit)
+        url_values['limit'] = limit
+    pagination_helper = PaginationHelper(
+        request,
+        query=category_notifications(id),
+        resource_for_url='category.notificationcategoryresource',
+        key_name='notifications',
+        schema=notifications_schema,
+        cursor_columns=(Notification.message, Notification.id),
+        url_values=url_values,
+        page_size=limit,
+    )
+    notifications_result = pagination_helper.paginate_query_by_cursor()
+    return {'category': category_data, **notifications_result}
+
+
 class NotificationCategoryResource(AuthenticationRequiredResource):
     def get(self, id):
-        notification_category = NotificationCategory.query.get_or_404(id)
-        category_data = category_schema.dump(notification_category)
-        notifications_data = notifications_schema.dump(
-            notification_category.notifications
+        fields = requested_fields(request.args, category_schema)
+        category_version, notification_version = table_versions(
+            NotificationCategory, Notification
+        )
+        notification_category = NotificationCategory.get_current(id, category_version)
+        if notification_category is None:
+            abort(HttpStatus.not_found_404.value)
+        # Deletes don't move any timestamp, so the nested listing only gets an ETag
+        etag = make_etag(
+            request.full_path,
+            notification_category['version'],
+            notification_version,
+            Notification.next_expiry(),
+        )
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        return (
+            category_response(notification_category, id, fields),
+            HttpStatus.ok_200.value,
+            validator_headers(etag),
         )
-        return {'category': category_data, 'notifications': notifications_data}
 
     def patch(self, id):
         notification_category = NotificationCategory.query.get_or_404(id)
@@ -53,17 +110,9 @@ class NotificationCategoryResource(AuthenticationRequiredResource):
                 }
                 return response, HttpStatus.bad_request_400.value
 
-        try:
-            category_data = category_schema.dump(notification_category)
-            notifications_data = notifications_schema.dump(
-                notification_category.notifications
-            )
-        except ValidationError as err:
-            return {'messages': err.messages}, 422
-
         try:
             notification_category.update()
-            return {'category': category_data, 'notifications': notifications_data}
+            return category_response(notification_category, id)
         except SQLAlchemyError as err:
             orm.session.rollback()
             return {'messages': str(err)}, HttpStatus.bad_request_400.value
@@ -76,14 +125,28 @@ class NotificationCategoryResource(AuthenticationRequiredResource):
             return str(response), HttpStatus.no_content_204.value
         except SQLAlchemyError as err:
             orm.session.rollback()
-            return {'messages': str(err)}, HttpStatus.unathorized_401.value
+            return {'messages': str(err)}, HttpStatus.bad_request_400.value
 
 
 class NotificationCatergoryListResource(AuthenticationRequiredResource):
     def get(self):
-        notification_categories = NotificationCategory.query.all()
-        categories_data = categories_schema.dump(notification_categories)
-        return {'categories': categories_data}
+        fields = requested_fields(request.args, categories_schema)
+        query = NotificationCategory.query
+        if fields is not None:
+            query = query.options(column_options(NotificationCategory, fields))
+        etag = make_etag(request.full_path, *table_versions(NotificationCategory))
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        notification_categories = query.all()
+        serializer = serializer_for(sparse_schema(categories_schema, fields))
+        categories_data = serializer.dump(notification_categories)
+        return (
+            {'categories': categories_data},
+            HttpStatus.ok_200.value,
+            validator_headers(etag),
+        )
 
     def post(self):
         json_data = request.get_json()
@@ -99,26 +162,23 @@ class NotificationCatergoryListResource(AuthenticationRequiredResource):
         except ValidationError as err:
             return {'messages': err.messages}, 422
 
-        # check for category uniqueness
+        # The unique constraint on name does the duplicate check
         notification_category_name = category_data['name']
-        if not NotificationCategory.is_name_unique(
-            id=0, name=notification_category_name
-        ):
-            response = {
-                'message': duplicate_category_message.format(notification_category_name)
-            }
-            return response, HttpStatus.bad_request_400.value
-
         try:
-            notification_category = NotificationCategory(name=category_data['name'])
-            notification_category.add(notification_category)
-            query = NotificationCategory.query.get(notification_category.id)
-            category_data = category_schema.dump(query)
-            notifications_data = notifications_schema.dump(
-                notification_category.notifications
+            notification_category = NotificationCategory.add_unique(
+                name=notification_category_name
             )
+            if notification_category is None:
+                orm.session.rollback()
+                response = {
+                    'message': duplicate_category_message.format(
+                        notification_category_name
+                    )
+                }
+                return response, HttpStatus.bad_request_400.value
+            NotificationCategory.commit()
             return (
-                {'category': category_data, 'notifications': notifications_data},
+                category_response(notification_category, notification_category['id']),
                 HttpStatus.created_201.value,
             )
         except SQLAlchemyError as err:
@@ -1,12 +1,41 @@
-from flask import Blueprint, request, make_response
-from flask_restful import Api, Resource
-from sqlalchemy.exc import SQLAlchemyError
+import csv
+import io
+import json
+
+from dateutil.parser import isoparse
+from flask import (
+    Blueprint,
+    Response,
+    request,
+    make_response,
+    current_app,
+    stream_with_context,
+    url_for,
+)
+from flask_restful import Api, Resource, abort
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import joinedload
 from marshmallow import ValidationError
 
 from ..utils.http_status import HttpStatus
-from ..models.base import db as orm
-from ..models.notification import Notification, NotificationSchema
-from ..models.category import NotificationCategory
+from ..utils.conditional import (
+    last_modified_of,
+    make_etag,
+    not_modified,
+    validator_headers,
+)
+from ..broker import OVERFLOW, record_event
+from ..models.base import db as orm, is_foreign_key_violation, table_versions
+from ..models.notification import (
+    Notification,
+    NotificationChange,
+    NotificationChangeWatermark,
+    NotificationSchema,
+)
+from ..models.category import NotificationCategory, category_cache
+from ..utils.fieldsets import column_options, requested_fields, sparse_schema
+from ..utils.serialization import serializer_for
 from ..helpers import PaginationHelper
 from .user import AuthenticationRequiredResource
 
@@ -19,14 +48,166 @@ notification = Api(bp)
 duplicate_notification_message = 'A notification with message "{}" already exists.'
 
 
+def notification_query(include_expired=False, fields=None):
+    # NotificationSchema nests the category, load it in the same SELECT. The
+    # foreign key is NOT NULL so an inner join is safe.
+    query = Notification.query
+    if fields is None or 'notification_category' in fields:
+        query = query.options(
+            joinedload(Notification.notification_category, innerjoin=True)
+        )
+    if fields is not None:
+        # besides the requested fields, cursors and validators need these
+        query = query.options(
+            column_options(
+                Notification,
+                fields,
+                Notification.notification_category_id,
+                Notification.creation_date,
+                Notification.version,
+                Notification.updated_at,
+            )
+        )
+    if not include_expired:
+        query = query.filter(Notification.active())
+    return query
+
+
+def parse_date_argument(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return isoparse(value)
+    except ValueError:
+        abort(
+            HttpStatus.bad_request_400.value,
+            message=f'"{name}" must be an ISO 8601 date or datetime.',
+        )
+
+
+def parse_int_argument(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        abort(HttpStatus.bad_request_400.value, message=f'"{name}" must be an integer.')
+
+
+def parse_bool_argument(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    abort(HttpStatus.bad_request_400.value, message=f'"{name}" must be true or false.')
+
+
+# ?sort= values, each backed by an index ending in id so pages are keyset scans
+notification_sorts = {
+    'creation_date': (Notification.creation_date, Notification.id),
+    'displayed_times': (Notification.displayed_times, Notification.id),
+}
+
+
+def sort_notifications(query, args):
+    # Returns the ordered query, its cursor columns and whether they descend
+    sort = args.get('sort') or 'creation_date'
+    descending = sort.startswith('-')
+    columns = notification_sorts.get(sort.lstrip('-'))
+    if columns is None:
+        abort(
+            HttpStatus.bad_request_400.value,
+            message='"sort" must be one of {}, optionally prefixed with "-".'.format(
+                ', '.join(notification_sorts)
+            ),
+        )
+    if descending:
+        query = query.order_by(*[column.desc() for column in columns])
+    else:
+        query = query.order_by(*[column.asc() for column in columns])
+    return query, columns, descending
+
+
+def filter_notifications(query, args):
+    # Returns the filtered query plus the arguments next/previous links must keep
+    url_values = {}
+
+    category_id = parse_int_argument(args, 'category_id')
+    if category_id is not None:
+        query = query.filter(Notification.notification_category_id == category_id)
+        url_values['category_id'] = category_id
+
+    category = args.get('category')
+    if category:
+        category_id = (
+            NotificationCategory.query.with_entities(NotificationCategory.id)
+            .filter_by(name=category)
+            .as_scalar()
+        )
+        query = query.filter(Notification.notification_category_id == category_id)
+        url_values['category'] = category
+
+    created_after = parse_date_argument(args, 'created_after')
+    if created_after is not None:
+        query = query.filter(Notification.creation_date >= created_after)
+        url_values['created_after'] = args['created_after']
+
+    created_before = parse_date_argument(args, 'created_before')
+    if created_before is not None:
+        query = query.filter(Notification.creation_date < created_before)
+        url_values['created_before'] = args['created_before']
+
+    displayed_once = parse_bool_argument(args, 'displayed_once')
+    if displayed_once is not None:
+        query = query.filter(Notification.displayed_once == displayed_once)
+        url_values['displayed_once'] = args['displayed_once']
+
+    displayed_times_min = parse_int_argument(args, 'displayed_times_min')
+    if displayed_times_min is not None:
+        query = query.filter(Notification.displayed_times >= displayed_times_min)
+        url_values['displayed_times_min'] = displayed_times_min
+
+    displayed_times_max = parse_int_argument(args, 'displayed_times_max')
+    if displayed_times_max is not None:
+        query = query.filter(Notification.displayed_times <= displayed_times_max)
+        url_values['displayed_times_max'] = displayed_times_max
+
+    return query, url_values
+
+
 class NotificationResource(AuthenticationRequiredResource):
     def get(self, id):
-        notification = Notification.query.get_or_404(id)
-        notification_result = notification_schema.dump(notification)
-        return {'notification': notification_result}
+        fields = requested_fields(request.args, notification_schema)
+        schema = sparse_schema(notification_schema, fields)
+        query = notification_query(fields=fields).filter(Notification.id == id)
+        notification = query.first_or_404()
+        versions = [notification.version]
+        timestamps = [notification.updated_at]
+        if 'notification_category' in schema.fields:
+            notification_category = notification.notification_category
+            versions.append(notification_category.version)
+            timestamps.append(notification_category.updated_at)
+        etag = make_etag('notification', notification.id, fields, *versions)
+        last_modified = last_modified_of(*timestamps)
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
+
+        notification_result = schema.dump(notification)
+        return (
+            {'notification': notification_result},
+            HttpStatus.ok_200.value,
+            validator_headers(etag, last_modified),
+        )
 
     def patch(self, id):
-        notification = Notification.query.get_or_404(id)
+        query = notification_query().filter(Notification.id == id)
+        notification = query.first_or_404()
         json_data = request.get_json()
 
         if 'message' in json_data and json_data['message'] is not None:
@@ -44,7 +225,12 @@ class NotificationResource(AuthenticationRequiredResource):
                 notification.message = notification_message
 
         if 'ttl' in json_data and json_data['ttl'] is not None:
-            notification.duration = json_data['ttl']
+            try:
+                ttl = notification_schema.fields['ttl'].deserialize(json_data['ttl'])
+            except ValidationError as err:
+                response = {'messages': {'ttl': err.messages}}
+                return response, HttpStatus.bad_request_400.value
+            notification.set_ttl(ttl)
 
         if 'displayed_times' in json_data and json_data['displayed_times'] is not None:
             notification.displayed_times = json_data['displayed_times']
@@ -58,6 +244,7 @@ class NotificationResource(AuthenticationRequiredResource):
             return {'messages': err.messages}, 422
 
         try:
+            record_event('updated', data)
             notification.update()
             return {'notification': data}
         except SQLAlchemyError as err:
@@ -78,17 +265,51 @@ class NotificationResource(AuthenticationRequiredResource):
             return response, HttpStatus.unathorized_401.value
 
 
+class NotificationDisplayedResource(AuthenticationRequiredResource):
+    def post(self, id):
+        # buffered and added to displayed_times by the display counter's next
+        # flush, unknown ids are dropped there
+        current_app.extensions['display_counter'].increment(id)
+        return '', HttpStatus.accepted_202.value
+
+
 class NotificationListResource(AuthenticationRequiredResource):
     def get(self):
+        fields = requested_fields(request.args, notification_schema)
+        query, url_values = filter_notifications(
+            notification_query(fields=fields), request.args
+        )
+        query, cursor_columns, descending = sort_notifications(query, request.args)
+        if 'sort' in request.args:
+            url_values['sort'] = request.args['sort']
+        if fields is None or 'notification_category' in fields:
+            related_models = (NotificationCategory,)
+        else:
+            related_models = ()
+        if fields is not None:
+            url_values['fields'] = ','.join(fields)
+        # Deletes don't move any timestamp, so collections only get an ETag
+        etag = make_etag(
+            request.full_path,
+            *table_versions(Notification, *related_models),
+            Notification.next_expiry(),
+        )
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
         pagination_helper = PaginationHelper(
             request,
-            query=Notification.query,
+            query=query,
             resource_for_url='notification.notificationlistresource',
             key_name='results',
-            schema=notification_schema,
+            schema=sparse_schema(notification_schema, fields),
+            cursor_columns=cursor_columns,
+            url_values=url_values,
+            descending=descending,
         )
         pagination_result = pagination_helper.paginate_query()
-        return pagination_result
+        return pagination_result, HttpStatus.ok_200.value, validator_headers(etag)
 
     def post(sef):
         json_data = request.get_json()
@@ -104,44 +325,446 @@ class NotificationListResource(AuthenticationRequiredResource):
         except ValidationError as err:
             return {'messages': err.messages}, 422
 
-        notification_message = data['message']
-        if not Notification.is_message_unique(id=0, message=notification_message):
+        # The unique constraint on message does the duplicate check, so the
+        # insert is a single INSERT ... ON CONFLICT DO NOTHING RETURNING
+        try:
+            notification_category, notification = add_notification(data)
+            if notification is None:
+                orm.session.rollback()
+                return (
+                    {'message': duplicate_notification_message.format(data['message'])},
+                    HttpStatus.bad_request_400.value,
+                )
+            notification['notification_category'] = notification_category
+            result = notification_schema.dump(notification)
+            record_event('created', result)
+            Notification.commit()
+            return {'notification': result}, HttpStatus.created_201.value
+        except SQLAlchemyError as err:
+            orm.session.rollback()
+            return {'messages': str(err)}, HttpStatus.bad_request_400.value
+
+
+def add_notification(data):
+    # The category may come from this worker's cache after another one deleted
+    # it. The insert then violates the foreign key and is tried once more with
+    # the category looked up again.
+    name = data['notification_category']['name']
+    for attempt in range(2):
+        notification_category = NotificationCategory.get_or_add(name=name)
+        try:
+            notification = Notification.add_unique(
+                message=data['message'],
+                ttl=data['ttl'],
+                notification_category_id=notification_category['id'],
+            )
+        except IntegrityError as err:
+            if attempt or not is_foreign_key_violation(err):
+                raise
+            orm.session.rollback()
+            category_cache.invalidate(('name', name))
+            continue
+        return notification_category, notification
+
+
+class NotificationSearchResource(AuthenticationRequiredResource):
+    def get(self):
+        terms = request.args.get('q', '').strip()
+        if not terms:
+            return {'message': '"q" is required.'}, HttpStatus.bad_request_400.value
+
+        fields = requested_fields(request.args, notification_schema)
+        query = Notification.search(notification_query(fields=fields), terms)
+        url_values = {'q': terms}
+        if fields is not None:
+            url_values['fields'] = ','.join(fields)
+        # ranked results page by OFFSET, a rank is no stable keyset
+        pagination_helper = PaginationHelper(
+            request,
+            query=query,
+            resource_for_url='notification.notificationsearchresource',
+            key_name='results',
+            schema=sparse_schema(notification_schema, fields),
+            url_values=url_values,
+        )
+        return pagination_helper.paginate_query(), HttpStatus.ok_200.value
+
+
+class NotificationChangesResource(AuthenticationRequiredResource):
+    def get(self):
+        since = parse_int_argument(request.args, 'since')
+        if since is None:
+            return (
+                {'message': '"since" is required, 0 reads the whole change log.'},
+                HttpStatus.bad_request_400.value,
+            )
+        # Changes past the retention are pruned, reading on from a cursor before
+        # the last pruned one would skip them. The client reloads and goes on
+        # from the current head.
+        watermark = orm.session.query(NotificationChangeWatermark.sequence).scalar()
+        if watermark is not None and since < watermark:
+            head = orm.session.query(func.max(NotificationChange.sequence)).scalar()
             return (
                 {
-                    'message': duplicate_notification_message.format(
-                        notification_message
-                    )
+                    'message': 'The change log no longer goes back to "since", '
+                    'reload the notifications and continue from "cursor".',
+                    'cursor': head,
                 },
+                HttpStatus.gone_410.value,
+            )
+        page_size = current_app.config['NOTIFICATION_CHANGES_PAGE_SIZE']
+        changes = (
+            orm.session.query(
+                NotificationChange.sequence,
+                NotificationChange.notification_id,
+                NotificationChange.operation,
+            )
+            .filter(NotificationChange.sequence > since)
+            .order_by(NotificationChange.sequence)
+            .limit(page_size + 1)
+            .all()
+        )
+        has_more = len(changes) > page_size
+        changes = changes[:page_size]
+
+        # only the last change of every notification in the page matters, and
+        # it comes with the current state of the notification
+        latest = {change.notification_id: change for change in changes}
+        changed_ids = [
+            id for id, change in latest.items() if change.operation != 'deleted'
+        ]
+        notifications = (
+            {
+                notification.id: notification
+                for notification in notification_query(include_expired=True).filter(
+                    Notification.id.in_(changed_ids)
+                )
+            }
+            if changed_ids
+            else {}
+        )
+        serializer = serializer_for(notification_schema)
+        results = []
+        for change in sorted(latest.values(), key=lambda change: change.sequence):
+            notification = notifications.get(change.notification_id)
+            results.append(
+                {
+                    'sequence': change.sequence,
+                    'operation': change.operation,
+                    'id': change.notification_id,
+                    # None for tombstones, and for rows deleted by a later change
+                    'notification': (
+                        serializer.dump(notification)
+                        if notification is not None
+                        else None
+                    ),
+                }
+            )
+
+        cursor = changes[-1].sequence if changes else since
+        if has_more:
+            next_url = url_for(
+                'notification.notificationchangesresource', since=cursor, _external=True
+            )
+        else:
+            next_url = None
+        return (
+            {'results': results, 'cursor': cursor, 'next': next_url},
+            HttpStatus.ok_200.value,
+        )
+
+
+export_csv_fields = (
+    'id',
+    'message',
+    'ttl',
+    'creation_date',
+    'notification_category',
+    'displayed_times',
+    'displayed_once',
+    'url',
+)
+
+
+class NotificationExportResource(AuthenticationRequiredResource):
+    def get(self):
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            return (
+                {'message': 'The export format must be "ndjson" or "csv".'},
                 HttpStatus.bad_request_400.value,
             )
 
+        query, _ = filter_notifications(notification_query(), request.args)
+        chunk_size = current_app.config['NOTIFICATION_EXPORT_CHUNK_SIZE']
+        # stream_results asks for a server-side cursor (PostgreSQL) and yield_per
+        # only builds chunk_size objects at a time, so memory stays flat
+        query = (
+            query.order_by(Notification.id)
+            .execution_options(stream_results=True)
+            .yield_per(chunk_size)
+        )
+
+        if export_format == 'csv':
+            rows = self.generate_csv(query, chunk_size)
+            mimetype = 'text/csv'
+        else:
+            rows = self.generate_ndjson(query, chunk_size)
+            mimetype = 'application/x-ndjson'
+        return Response(stream_with_context(rows), mimetype=mimetype)
+
+    @staticmethod
+    def chunks(query, chunk_size):
+        serializer = serializer_for(notifications_schema)
+        chunk = []
+        for notification in query:
+            chunk.append(notification)
+            if len(chunk) == chunk_size:
+                yield serializer.dump(chunk)
+                chunk = []
+        if chunk:
+            yield serializer.dump(chunk)
+
+    def generate_ndjson(self, query, chunk_size):
+        for chunk in self.chunks(query, chunk_size):
+            yield ''.join(json.dumps(item) + '\n' for item in chunk)
+
+    def generate_csv(self, query, chunk_size):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=export_csv_fields)
+        writer.writeheader()
+        for chunk in self.chunks(query, chunk_size):
+            for item in chunk:
+                item['notification_category'] = item['notification_category']['name']
+                writer.writerow(item)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+class NotificationStreamResource(AuthenticationRequiredResource):
+    def get(self):
+        category = request.args.get('category') or None
+        broker = current_app.extensions['notification_events']
+        heartbeat = current_app.config.get('EVENTS_HEARTBEAT_INTERVAL', 15)
+        # an idle stream must not keep a pooled connection checked out
+        orm.session.remove()
+        return Response(
+            stream_with_context(self.generate(broker, category, heartbeat)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+    @staticmethod
+    def generate(broker, category, heartbeat):
+        subscription = broker.subscribe(category)
         try:
-            notification_category_name = json_data['notification_category']['name']
-            notification_category = NotificationCategory.query.filter_by(
-                name=notification_category_name
-            ).first()
-
-            if notification_category is None:
-                # create new NotificationCategory
-                notification_category = NotificationCategory(
-                    name=notification_category_name
-                )
-                orm.session.add(notification_category)
+            yield f'retry: {heartbeat * 1000}\n\n'
+            while True:
+                event = subscription.get(timeout=heartbeat)
+                if event is None:
+                    yield ': keep-alive\n\n'
+                elif event is OVERFLOW:
+                    yield 'event: overflow\ndata: {}\n\n'
+                    return
+                else:
+                    yield 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+                        event['id'], event['event'], json.dumps(event['notification'])
+                    )
+        finally:
+            broker.unsubscribe(subscription)
 
-            # create Notification
-            notification = Notification(
-                message=data['message'],
-                ttl=data['ttl'],
-                notification_category=notification_category,
+
+def load_batch_items(request):
+    # Accept either a JSON array or one JSON document per line (NDJSON)
+    if request.mimetype == 'application/x-ndjson':
+        items = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+        return items
+    return request.get_json()
+
+
+def duplicate_result(message):
+    return {
+        'status': HttpStatus.bad_request_400.value,
+        'message': duplicate_notification_message.format(message),
+    }
+
+
+class NotificationBatchResource(AuthenticationRequiredResource):
+    def post(self):
+        items = load_batch_items(request)
+
+        if not items or not isinstance(items, list):
+            return (
+                {'message': 'No input data provided'},
+                HttpStatus.bad_request_400.value,
             )
-            orm.session.add(notification)
-            orm.session.commit()
-            result = notification_schema.dump(Notification.query.get(notification.id))
-            return {'notification': result}, HttpStatus.created_201.value
+
+        max_size = current_app.config['NOTIFICATION_BATCH_MAX_SIZE']
+        if len(items) > max_size:
+            return (
+                {'message': f'A batch can hold at most {max_size} notifications.'},
+                HttpStatus.request_entity_too_large_413.value,
+            )
+
+        results = [None] * len(items)
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[index] = {
+                    'status': 422,
+                    'messages': {'_schema': ['Invalid input type.']},
+                }
+
+        # validate every well-formed item in a single schema pass
+        indexes = [index for index, result in enumerate(results) if result is None]
+        try:
+            loaded = notifications_schema.load([items[index] for index in indexes])
+            errors = {}
+        except ValidationError as err:
+            loaded, errors = err.valid_data, err.messages
+
+        pending = {}
+        for position, index in enumerate(indexes):
+            item_errors = errors.get(position, {})
+            data = loaded[position]
+            if 'ttl' not in data and 'ttl' not in item_errors:
+                item_errors['ttl'] = ['Missing data for required field.']
+            if item_errors:
+                results[index] = {'status': 422, 'messages': item_errors}
+            else:
+                pending[index] = data
+
+        # later duplicates inside the batch lose against the first occurrence,
+        # the unique constraint on message catches the ones that already exist
+        messages = set()
+        for index, data in list(pending.items()):
+            if data['message'] in messages:
+                results[index] = duplicate_result(data['message'])
+                del pending[index]
+            else:
+                messages.add(data['message'])
+
+        try:
+            created = {}
+            if pending:
+                created = self.add_notifications(list(pending.values()))
+                for result in created.values():
+                    record_event('created', result)
+                Notification.commit()
         except SQLAlchemyError as err:
             orm.session.rollback()
             return {'messages': str(err)}, HttpStatus.bad_request_400.value
 
+        for index, data in pending.items():
+            if data['message'] in created:
+                results[index] = {
+                    'status': HttpStatus.created_201.value,
+                    'notification': created[data['message']],
+                }
+            else:
+                # inserted by a concurrent request since the batch was checked
+                results[index] = duplicate_result(data['message'])
+
+        if len(created) == len(items):
+            status = HttpStatus.created_201.value
+        else:
+            status = HttpStatus.multi_status_207.value
+        return (
+            {
+                'results': results,
+                'created': len(created),
+                'failed': len(items) - len(created),
+            },
+            status,
+        )
+
+    @classmethod
+    def add_notifications(cls, batch):
+        # Returns the inserted notifications, dumped, by message. Like
+        # add_notification() a stale cached category is retried once.
+        names = {data['notification_category']['name'] for data in batch}
+        for attempt in range(2):
+            categories = cls.resolve_categories(names)
+            try:
+                rows = Notification.add_many_unique(
+                    [
+                        {
+                            'message': data['message'],
+                            'ttl': data['ttl'],
+                            'notification_category_id': categories[
+                                data['notification_category']['name']
+                            ]['id'],
+                        }
+                        for data in batch
+                    ]
+                )
+            except IntegrityError as err:
+                if attempt or not is_foreign_key_violation(err):
+                    raise
+                orm.session.rollback()
+                category_cache.invalidate(*[('name', name) for name in names])
+                continue
+            categories_by_id = {
+                category['id']: category for category in categories.values()
+            }
+            created = {}
+            for row in rows:
+                row['notification_category'] = categories_by_id[
+                    row['notification_category_id']
+                ]
+                created[row['message']] = notification_schema.dump(row)
+            return created
+
+    @staticmethod
+    def resolve_categories(names):
+        categories = {}
+        for name in names:
+            category = category_cache.get(('name', name))
+            if category is not None:
+                categories[name] = category
+        uncached = names - categories.keys()
+        if uncached:
+            rows = NotificationCategory.cached_query().filter(
+                NotificationCategory.name.in_(uncached)
+            )
+            for row in rows:
+                category = row._asdict()
+                NotificationCategory.cache(category)
+                categories[category['name']] = category
+        missing = names - categories.keys()
+        if missing:
+            # not cached: the inserts may still be rolled back
+            for category in NotificationCategory.add_many_unique(
+                [{'name': name} for name in sorted(missing)]
+            ):
+                categories[category['name']] = category
+            # created by a concurrent request since the lookup
+            raced = names - categories.keys()
+            if raced:
+                rows = NotificationCategory.cached_query().filter(
+                    NotificationCategory.name.in_(raced)
+                )
+                for row in rows:
+                    categories[row.name] = row._asdict()
+        return categories
+
 
 notification.add_resource(NotificationListResource, '/notifications')
+notification.add_resource(NotificationBatchResource, '/notifications/batch')
+notification.add_resource(NotificationExportResource, '/notifications/export')
+notification.add_resource(NotificationSearchResource, '/notifications/search')
+notification.add_resource(NotificationStreamResource, '/notifications/stream')
+notification.add_resource(NotificationChangesResource, '/notifications/changes')
 notification.add_resource(NotificationResource, '/notifications/<int:id>')
+notification.add_resource(
+    NotificationDisplayedResource, '/notifications/<int:id>/displayed'
+)
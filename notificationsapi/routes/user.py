@@ -1,15 +1,20 @@
-from flask_httpauth import HTTPBasicAuth
-from flask import g, Blueprint, request
+from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth, MultiAuth
+from flask import g, Blueprint, request, current_app
 from flask_restful import Resource, Api
 from sqlalchemy.exc import SQLAlchemyError
 from marshmallow import ValidationError
 
+from ..metrics import auth_duration
+from ..ratelimit import limit_user
 from ..utils.http_status import HttpStatus
+from ..utils.fieldsets import column_options, requested_fields, sparse_schema
 from ..models.user import User, UserSchema
 from ..helpers import PaginationHelper
 from ..models.base import ma as orm
 
-auth = HTTPBasicAuth()
+basic_auth = HTTPBasicAuth()
+token_auth = HTTPTokenAuth(scheme='Bearer')
+auth = MultiAuth(basic_auth, token_auth)
 
 bp = Blueprint('user', __name__)
 user = Api(bp)
@@ -17,10 +22,23 @@ user = Api(bp)
 user_schema = UserSchema(unknown='EXCLUDE')
 
 
-@auth.verify_password
+@basic_auth.verify_password
 def verify_user_password(name, password):
-    user = User.query.filter_by(name=name).first()
-    if not user or not user.verify_password(password):
+    with auth_duration.time('basic'):
+        user = User.query.filter_by(name=name).first()
+        if not user or not user.verify_password(password):
+            return False
+        # only verified credentials are charged to the user, see RateLimiter
+        limit_user(user.id)
+    g.user = user
+    return True
+
+
+@token_auth.verify_token
+def verify_user_token(token):
+    with auth_duration.time('token'):
+        user = User.verify_auth_token(token)
+    if user is None:
         return False
     g.user = user
     return True
@@ -32,20 +50,41 @@ class AuthenticationRequiredResource(Resource):
 
 class UserResource(AuthenticationRequiredResource):
     def get(self, id):
-        user = User.query.get_or_404(id)
-        result = user_schema.dump(user)
+        fields = requested_fields(request.args, user_schema)
+        query = User.query
+        if fields is not None:
+            query = query.options(column_options(User, fields))
+        user = query.get_or_404(id)
+        result = sparse_schema(user_schema, fields).dump(user)
         return result
 
 
+class UserTokenResource(Resource):
+    # tokens can only be issued against a password so they can't be renewed forever
+    method_decorators = [basic_auth.login_required]
+
+    def get(self):
+        token = g.user.generate_auth_token()
+        return {'token': token, 'duration': current_app.config['AUTH_TOKEN_EXPIRATION']}
+
+
 class UserListResource(Resource):
     @auth.login_required
     def get(self):
+        fields = requested_fields(request.args, user_schema)
+        query = User.query
+        url_values = {}
+        if fields is not None:
+            query = query.options(column_options(User, fields, User.creation_date))
+            url_values['fields'] = ','.join(fields)
         pagination_helper = PaginationHelper(
             request,
-            query=User.query,
+            query=query,
             resource_for_url='user.userlistresource',
             key_name='results',
-            schema=user_schema,
+            schema=sparse_schema(user_schema, fields),
+            cursor_columns=(User.creation_date, User.id),
+            url_values=url_values,
         )
         result = pagination_helper.paginate_query()
         return result
@@ -68,7 +107,6 @@ class UserListResource(Resource):
             return response, HttpStatus.bad_request_400.value
 
         try:
-            print('json_data --> ', json_data)
             user = User(name=user_name)
             error_message, password_ok = user.check_password_strength_and_hash_if_ok(
                 json_data['password']
@@ -87,4 +125,5 @@ class UserListResource(Resource):
 
 
 user.add_resource(UserResource, '/users/<int:id>')
+user.add_resource(UserTokenResource, '/users/token')
 user.add_resource(UserListResource, '/users')
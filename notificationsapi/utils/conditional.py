@@ -0,0 +1,35 @@
+from hashlib import md5
+
+from flask import Response, request
+from werkzeug.http import http_date, is_resource_modified, quote_etag
+
+from .http_status import HttpStatus
+
+
+def make_etag(*parts):
+    # Built from row and table versions, never from the response body
+    digest = md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+    # weak: the JSON key order of equivalent representations may differ
+    return quote_etag(digest, weak=True)
+
+
+def last_modified_of(*timestamps):
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    return max(timestamps) if timestamps else None
+
+
+def validator_headers(etag, last_modified=None):
+    headers = {'ETag': etag}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response when the client's copy is current, otherwise None."""
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return Response(
+        status=HttpStatus.not_modified_304.value,
+        headers=validator_headers(etag, last_modified),
+    )
@@ -0,0 +1,128 @@
+from threading import Lock
+
+from sqlalchemy import text
+
+from .cache import LRUCache
+
+
+def query_table_name(query):
+    return query.column_descriptions[0]['entity'].__table__.name
+
+
+def exact_count(query):
+    return query.order_by(None).count(), True
+
+
+class CountCache:
+    """Bounded LRU of counts, each entry tied to the table it counts.
+
+    invalidate() moves a table on to a new generation instead of looking for
+    its entries: the old ones are never read again and age out of the LRU.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.entries = LRUCache(maxsize=maxsize)
+        self._generations = {}
+        self._lock = Lock()
+
+    def configure(self, maxsize):
+        self.entries.configure(maxsize=maxsize, ttl=self.entries.ttl)
+
+    def key(self, table_name, key):
+        # taken before counting, so a write committed meanwhile isn't hidden
+        with self._lock:
+            return table_name, self._generations.get(table_name, 0), key
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, count, ttl):
+        self.entries.set(key, count, ttl=ttl)
+
+    def invalidate(self, *table_names):
+        with self._lock:
+            for table_name in table_names:
+                self._generations[table_name] = self._generations.get(table_name, 0) + 1
+
+    def clear(self):
+        self.entries.clear()
+
+
+count_cache = CountCache()
+
+
+class CachedCount:
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def __call__(self, query):
+        statement = query.order_by(None).statement.compile()
+        key = count_cache.key(
+            query_table_name(query),
+            (str(statement), tuple(sorted(statement.params.items(), key=repr))),
+        )
+        count = count_cache.get(key)
+        if count is not None:
+            # the value was exact when taken but other processes may have written since
+            return count, False
+        count, exact = exact_count(query)
+        if not query.session.uses_replica():
+            count_cache.set(key, count, self.ttl)
+        return count, exact
+
+
+def is_filtered(query):
+    if query.whereclause is None:
+        return False
+    # Expired rows are purged in the background, so a listing of the active
+    # ones alone is estimated like the whole table
+    active = getattr(query.column_descriptions[0]['entity'], 'active', None)
+    return active is None or str(query.whereclause) != str(active())
+
+
+def estimated_count(query):
+    session = query.session
+    dialect = session.get_bind().dialect.name
+    table_name = query_table_name(query)
+    filtered = is_filtered(query)
+
+    if dialect == 'postgresql':
+        if filtered:
+            statement = query.order_by(None).statement.compile(
+                dialect=session.get_bind().dialect
+            )
+            plan = (
+                session.connection()
+                .execute('EXPLAIN (FORMAT JSON) ' + str(statement), statement.params)
+                .scalar()
+            )
+            return int(plan[0]['Plan']['Plan Rows']), False
+        estimate = session.execute(
+            text('SELECT reltuples::bigint FROM pg_class WHERE relname = :name'),
+            {'name': table_name},
+        ).scalar()
+        # reltuples is -1 (or 0) until the table has been vacuumed or analyzed
+        if estimate is not None and estimate > 0:
+            return int(estimate), False
+    elif dialect == 'sqlite' and not filtered:
+        # rowid tables keep max(rowid) in the rightmost b-tree leaf
+        estimate = session.execute(
+            text('SELECT max(rowid) FROM "{}"'.format(table_name))
+        ).scalar()
+        return estimate or 0, False
+
+    return exact_count(query)
+
+
+def get_count_strategy(config, resource_for_url):
+    strategies = config.get('PAGINATION_COUNT_STRATEGIES') or {}
+    name = strategies.get(
+        resource_for_url, config.get('PAGINATION_COUNT_STRATEGY', 'exact')
+    )
+    if name == 'exact':
+        return exact_count
+    if name == 'cached':
+        return CachedCount(ttl=int(config.get('PAGINATION_COUNT_CACHE_TTL', 30)))
+    if name == 'estimated':
+        return estimated_count
+    raise ValueError('Unknown pagination count strategy "{}"'.format(name))
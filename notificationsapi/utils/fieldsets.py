@@ -0,0 +1,57 @@
+from flask_restful import abort
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+
+from .cache import LRUCache
+from .http_status import HttpStatus
+
+# Restricted schemas are keyed by client input, so they are kept in a bounded cache
+sparse_schemas = LRUCache(maxsize=256, ttl=24 * 3600)
+
+
+def requested_fields(args, schema):
+    """Return the field names of ?fields=a,b as a tuple, or None if it is absent."""
+    value = args.get('fields')
+    if value is None:
+        return None
+    fields = tuple(
+        dict.fromkeys(name.strip() for name in value.split(',') if name.strip())
+    )
+    if not fields:
+        abort(HttpStatus.bad_request_400.value, message='No fields requested.')
+    unknown = [name for name in fields if name not in schema.fields]
+    if unknown:
+        abort(
+            HttpStatus.bad_request_400.value,
+            message='Unknown fields: {}.'.format(', '.join(unknown)),
+        )
+    return fields
+
+
+def sparse_schema(schema, fields):
+    """Return schema restricted to fields, which may be None for all of them."""
+    if fields is None:
+        return schema
+    key = (id(schema), fields)
+    restricted = sparse_schemas.get(key)
+    if restricted is None:
+        restricted = type(schema)(
+            only=fields,
+            exclude=schema.exclude,
+            many=schema.many,
+            unknown=schema.unknown,
+        )
+        sparse_schemas.set(key, restricted)
+    return restricted
+
+
+def column_options(model, fields, *required):
+    """Return a load_only() option for the columns behind fields.
+
+    required are columns the resource needs besides the representation, like
+    cursor columns or ETag inputs. The primary key is always loaded.
+    """
+    column_attrs = inspect(model).column_attrs
+    names = [name for name in fields if name in column_attrs]
+    names += [column.key for column in required]
+    return load_only(*dict.fromkeys(names))
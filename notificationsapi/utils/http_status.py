@@ -11,6 +11,7 @@ class HttpStatus(Enum):
     no_content_204 = 204
     reset_content_205 = 205
     partial_content_206 = 206
+    multi_status_207 = 207
     multiple_choices_300 = 300
     moved_permanetly_301 = 301
     found_302 = 302
@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self.parameters = []
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self.record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self.record)
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def assert_num_queries(engine, expected):
+    """Fail if the block runs a different number of SQL statements.
+
+    Usage::
+
+        with assert_num_queries(db.engine, 2):
+            client.get('/notifications', headers=headers)
+    """
+    with QueryCounter(engine) as counter:
+        yield counter
+    if counter.count != expected:
+        raise AssertionError(
+            '{} SQL statements were executed, {} expected:\n{}'.format(
+                counter.count, expected, '\n'.join(counter.statements)
+            )
+        )